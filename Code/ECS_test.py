@@ -1,4 +1,6 @@
 from __future__ import annotations
+from array import array
+import numpy as np
 import pygame
 import constants
 
@@ -8,39 +10,226 @@ TILE_SIZE = 64
 DEFAULT_COLOR = constants.BLUE
 
 
+class ComponentStore:
+    # One contiguous column per component field, packed by a dense/sparse index over entity ids
+    def __init__(self, component_type: type[Component], capacity: int = 64):
+        self.componentType = component_type
+        self.key = component_type.key
+        self.sparse = array("i")
+        self.entities = array("i")
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in component_type.fields.items()}
+
+    def __contains__(self, entity: int) -> bool:
+        return entity < len(self.sparse) and self.sparse[entity] != -1
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def column(self, name: str) -> np.ndarray:
+        # View over the live rows only
+        return self.columns[name][:len(self.entities)]
+
+    def add(self, entity: int, values: dict):
+        if entity >= len(self.sparse):
+            self.sparse.extend([-1] * (entity + 1 - len(self.sparse)))
+        index = len(self.entities)
+        if index == len(self.columns[next(iter(self.columns))]):
+            for name, column in self.columns.items():
+                self.columns[name] = np.concatenate((column, np.zeros(len(column), dtype=column.dtype)))
+        self.entities.append(entity)
+        self.sparse[entity] = index
+        for name, column in self.columns.items():
+            column[index] = values.get(name, column.dtype.type())
+
+    def remove(self, entity: int):
+        # The last row moves into the hole so the columns stay packed
+        index = self.sparse[entity]
+        last = len(self.entities) - 1
+        moved = self.entities[last]
+        for column in self.columns.values():
+            column[index] = column[last]
+            column[last] = column.dtype.type()
+        self.entities[index] = moved
+        self.sparse[moved] = index
+        self.entities.pop()
+        self.sparse[entity] = -1
+
+    def get(self, entity: int, name: str):
+        return self.columns[name][self.sparse[entity]]
+
+    def set(self, entity: int, name: str, value):
+        self.columns[name][self.sparse[entity]] = value
+
+
+class World:
+    def __init__(self):
+        self.nextId = 0
+        self.freeIds: list[int] = []
+        # One byte per entity id, set while it is alive
+        self.alive = bytearray()
+        self.names: dict[int, str] = {}
+        self.stores: dict[str, ComponentStore] = {}
+        # Entities matching each component signature, kept up to date as components come and go
+        self.queries: dict[frozenset[str], set[int]] = {}
+        self.signatures: dict[str, list[frozenset[str]]] = {}
+        self.systems: list[System] = []
+
+    def create_entity(self, name: str = None, key: int = None) -> Entity:
+        if key is None:
+            key = self.freeIds.pop() if self.freeIds else self.nextId
+        elif key in self.freeIds:
+            self.freeIds.remove(key)
+        if key >= len(self.alive):
+            # Ids skipped over by an explicit key stay available
+            self.freeIds.extend(range(key - 1, len(self.alive) - 1, -1))
+            self.alive.extend(bytes(key + 1 - len(self.alive)))
+            self.nextId = key + 1
+        self.alive[key] = 1
+        if name is not None:
+            self.names[key] = name
+        return Entity(key, name, self)
+
+    def is_alive(self, entity: int) -> bool:
+        return entity < len(self.alive) and self.alive[entity] == 1
+
+    def destroy_entity(self, entity: int):
+        if not self.is_alive(entity):
+            return
+        for component_key in list(self.stores):
+            self.remove_component(entity, component_key)
+        self.names.pop(entity, None)
+        self.alive[entity] = 0
+        self.freeIds.append(entity)
+
+    def store(self, component_type: type[Component]) -> ComponentStore:
+        store = self.stores.get(component_type.key)
+        if store is None:
+            store = ComponentStore(component_type)
+            self.stores[component_type.key] = store
+        return store
+
+    def add_component(self, entity: int, component: Component):
+        store = self.store(type(component))
+        # A component already attached elsewhere is copied
+        values = component.values if component.store is None else \
+            {name: component.get(name) for name in component.fields}
+        if entity in store:
+            store.remove(entity)
+        store.add(entity, values)
+        component.attach(store, entity)
+        for signature in self.signatures.get(store.key, ()):
+            if self.has_component(entity, *signature):
+                self.queries[signature].add(entity)
+
+    def get_component(self, entity: int, component_key: str) -> Component | None:
+        store = self.stores.get(component_key)
+        if store is None or entity not in store:
+            return None
+        return store.componentType.view(store, entity)
+
+    def has_component(self, entity: int, *component_keys: str) -> bool:
+        for component_key in component_keys:
+            store = self.stores.get(component_key)
+            if store is None or entity not in store:
+                return False
+        return True
+
+    def remove_component(self, entity: int, component_key: str):
+        store = self.stores.get(component_key)
+        if store is not None and entity in store:
+            store.remove(entity)
+            for signature in self.signatures.get(component_key, ()):
+                self.queries[signature].discard(entity)
+
+    def query(self, *component_keys: str) -> set[int]:
+        # The returned set is live, filtered once here and then only touched by component changes
+        signature = frozenset(component_keys)
+        entities = self.queries.get(signature)
+        if entities is None:
+            stores = [self.stores.get(component_key) for component_key in signature]
+            if not stores or None in stores:
+                entities = set()
+            else:
+                smallest = min(stores, key=len)
+                entities = {entity for entity in smallest.entities if self.has_component(entity, *signature)}
+            self.queries[signature] = entities
+            for component_key in signature:
+                self.signatures.setdefault(component_key, []).append(signature)
+        return entities
+
+    def add_system(self, system: System):
+        system.world = self
+        system.entities = self.query(*system.requiredComponents)
+        self.systems.append(system)
+
+
 class Entity:
-    def __init__(self, key: int = None, name: str = None):
+    # A handle on an entity id, its components live in the world's columns
+    __slots__ = ("key", "name", "world")
+
+    def __init__(self, key: int = None, name: str = None, world: World = None):
+        self.world = world if world is not None else default_world
+        if key is None:
+            key = self.world.create_entity(name).key
+        elif not self.world.is_alive(key):
+            self.world.create_entity(name, key)
         self.key = key
         self.name = name
-        self.components: dict[str, Component] = {}
 
     def add_component(self, component: Component) -> None:
         if component.key is not None:
-            self.components[component.key] = component
+            self.world.add_component(self.key, component)
 
     def get_component(self, component_key: str) -> Component | None:
-        if component_key not in self.components.keys():
-            return None
-        return self.components[component_key]
+        return self.world.get_component(self.key, component_key)
 
     def has_component(self, component_key: str, *other_component_keys: str) -> bool:
-        for component in [component_key] + list(other_component_keys):
-            if component not in self.components.keys():
-                return False
-        return True
+        return self.world.has_component(self.key, component_key, *other_component_keys)
 
     def remove_component(self, component_key: str):
-        if component_key in self.components.keys():
-            self.components.pop(component_key)
+        self.world.remove_component(self.key, component_key)
 
 
 class Component:
     key: str = None
+    # Column name and dtype of every field stored in the world
+    fields: dict[str, type] = {}
+
+    def __init__(self, **values):
+        # Held here until the component is added to an entity
+        self.values = values
+        self.store: ComponentStore | None = None
+        self.entity: int | None = None
+
+    @classmethod
+    def view(cls, store: ComponentStore, entity: int) -> Component:
+        component = cls.__new__(cls)
+        component.values = {}
+        component.attach(store, entity)
+        return component
+
+    def attach(self, store: ComponentStore, entity: int):
+        self.store = store
+        self.entity = entity
+
+    def get(self, name: str):
+        if self.store is None:
+            return self.values.get(name, np.dtype(self.fields[name]).type())
+        return self.store.get(self.entity, name)
+
+    def set(self, name: str, value):
+        if self.store is None:
+            self.values[name] = value
+        else:
+            self.store.set(self.entity, name, value)
 
 
 class System:
     key: str = None
     requiredComponents = []
+    # Set by World.add_system, the entities having every required component
+    world: World = None
+    entities: set[int] = frozenset()
 
     def update(self): ...
 
@@ -53,69 +242,87 @@ class Renderer(System):
     def render_entity(self, entity: Entity, surface: pygame.Surface):
         component_graphic: GraphicComponent = entity.get_component("graphic")
         component_position: PositionComponent = entity.get_component("position")
+        if component_graphic.image is None:
+            return
 
         component_graphic.rect.x = component_position.x
         component_graphic.rect.y = component_position.y
 
         surface.blit(component_graphic.image, component_graphic.rect)
 
+    def render(self, surface: pygame.Surface):
+        # Reads the columns directly for every matching entity and blits them in one call
+        if not self.entities:
+            # The stores may not exist yet
+            return
+        positions = self.world.stores["position"]
+        graphics = self.world.stores["graphic"]
+        x, y = positions.columns["x"], positions.columns["y"]
+        images = graphics.columns["image"]
+        blits = []
+        for entity in self.entities:
+            image = images[graphics.sparse[entity]]
+            if image is not None:
+                index = positions.sparse[entity]
+                blits.append((image, (x[index], y[index])))
+        surface.blits(blits, doreturn=False)
+
 
 class PositionComponent(Component):
-    def __init__(self):
-        self.key = "position"
-        self.__vector = pygame.math.Vector2((0, 0))
-        self.__layer = 0
+    key = "position"
+    fields = {"x": np.float64, "y": np.float64, "z": np.int32}
 
     @property
     def x(self):
-        return self.__vector.x
+        return self.get("x")
 
     @property
     def y(self):
-        return self.__vector.y
+        return self.get("y")
 
     @property
     def z(self):
-        return self.__layer
+        return self.get("z")
 
     @x.setter
     def x(self, value: int | float):
-        self.__vector.x = value
+        self.set("x", value)
 
     @y.setter
     def y(self, value: int | float):
-        self.__vector.y = value
+        self.set("y", value)
 
     @z.setter
     def z(self, value: int):
-        self.__layer = value
+        self.set("z", value)
 
 
 class GraphicComponent(Component):
-    def __init__(self):
-        self.key = "graphic"
-        self.__image = pygame.Surface((TILE_SIZE, TILE_SIZE))
-        self.__rect = self.image.get_rect()
+    key = "graphic"
+    fields = {"image": object, "rect": object}
 
     @property
-    def image(self):
-        return self.__image
+    def image(self) -> pygame.Surface | None:
+        # No surface exists until one is assigned or loaded
+        return self.get("image")
 
     @property
-    def rect(self):
-        return self.__rect
+    def rect(self) -> pygame.Rect | None:
+        return self.get("rect")
 
     @image.setter
     def image(self, image: pygame.Surface):
-        self.__image = image
-        self.__rect = self.__image.get_rect()
+        self.set("image", image)
+        self.set("rect", image.get_rect())
 
-    @image.setter
-    def image(self, path: str, convert_alpha=True):
-        self.__image = pygame.image.load(path)
+    def load(self, path: str, convert_alpha=True):
+        image = pygame.image.load(path)
         if convert_alpha:
-            self.__image = self.__image.convert_alpha()
-        self.__rect = self.__image.get_rect()
+            image = image.convert_alpha()
+        self.image = image
+
+
+default_world = World()
 
 
 class Scene:
@@ -131,10 +338,15 @@ class Game:
         self.running = True
         self.sprites = pygame.sprite.Group()
         # Setup
-        self.player = Entity(0, "player")
-        self.player.add_component(GraphicComponent())
+        self.world = World()
+        self.player = self.world.create_entity("player")
+        graphic = GraphicComponent()
+        graphic.image = pygame.Surface((TILE_SIZE, TILE_SIZE))
+        graphic.image.fill(DEFAULT_COLOR)
+        self.player.add_component(graphic)
         self.player.add_component(PositionComponent())
         self.renderer = Renderer()
+        self.world.add_system(self.renderer)
 
     def render(self):
         # Blit the game canvas on display
@@ -143,7 +355,7 @@ class Game:
     def draw(self):
         self.gameCanvas.fill(constants.BG_COLOR1)
         self.sprites.draw(self.gameCanvas)
-        self.renderer.render_entity(self.player, self.gameCanvas)
+        self.renderer.render(self.gameCanvas)
         self.render()
 
     def update(self):
@@ -4,6 +4,8 @@ import basic_player
 import basic_inventory
 import scene
 import inventory
+import save
+import dirty_rects
 
 
 class Game:
@@ -16,15 +18,14 @@ class Game:
         self.running = True
         self.sceneManager = scene.SceneManager()
         # self.sceneManager.set_scene(scene.BasicScene(self.gameCanvas))
-        self.sceneManager.set_scene(inventory.SceneInventory(self.gameCanvas, 1))
+        self.sceneManager.set_scene(inventory.SceneInventory(self.gameCanvas, 1, save_path=save.SAVE_PATH))
 
     def draw(self):
-        self.sceneManager.draw()
-        self.scale_canvas()
+        self.scale_canvas(self.sceneManager.draw())
 
-    def scale_canvas(self):
-        # Blit the game canvas on display and scale it up
-        self.display.blit(pygame.transform.scale(self.gameCanvas, (constants.WIDTH, constants.HEIGHT)), (0, 0))
+    def scale_canvas(self, regions: list[pygame.Rect]):
+        # Scale the redrawn canvas regions up onto the display and update only those
+        dirty_rects.present(self.gameCanvas, self.display, regions)
 
     def update(self):
         self.sceneManager.update(self.clock.tick() / 1000)
@@ -39,13 +40,14 @@ class Game:
             for event in pygame.event.get():
                 event: pygame.event.Event
                 if event.type == pygame.QUIT:
+                    # Lets the scene flush its state before quitting
+                    self.sceneManager.event_loop(event)
                     pygame.quit()
                     exit()
                 self.sceneManager.event_loop(event)
 
             self.update()
             self.draw()
-            pygame.display.update()
 
 
 if __name__ == '__main__':
@@ -2,7 +2,8 @@ from enum import Enum
 import pygame
 import constants
 import base_game
-import json
+import fonts
+import item_registry
 
 
 class ItemId(Enum):
@@ -14,16 +15,78 @@ class ItemId(Enum):
 
 
 class Item:
-    name: str
-    description: str
-    icon: pygame.Surface
+    # Per instance state only, the definition data and icon are shared through the registry
+    __slots__ = ("id", "definition")
 
     def __init__(self, item_id: ItemId):
-        with open("../Data/items.json") as data:
-            items_data = json.load(data)
-        self.name = items_data[item_id.value]["name"]
-        self.description = items_data[item_id.value]["description"]
-        self.icon = pygame.image.load(items_data[item_id.value]["iconPath"]).convert_alpha()
+        self.id = item_id
+        self.definition = item_registry.registry.get(item_id.value)
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+    @property
+    def description(self) -> str:
+        return self.definition.description
+
+    @property
+    def icon(self) -> pygame.Surface:
+        return self.definition.icon
+
+
+class ItemResources:
+    # Surfaces derived from an item definition, built on first use and shared by every InventoryItem showing it
+    hoverSurface: pygame.Surface = None
+
+    def __init__(self, definition: item_registry.ItemDefinition):
+        self.definition = definition
+        self.size = (constants.TILE_SIZE * 2, constants.TILE_SIZE * 2)
+        self.__mask = None
+        self.__hoverImage = None
+        self.__info = None
+
+    @property
+    def image(self) -> pygame.Surface:
+        return item_registry.scaled_icon(self.definition, self.size, smooth=True)
+
+    @property
+    def mask(self) -> pygame.mask.Mask:
+        if self.__mask is None:
+            self.__mask = pygame.mask.from_surface(self.image)
+        return self.__mask
+
+    @property
+    def hoverImage(self) -> pygame.Surface:
+        if self.__hoverImage is None:
+            if ItemResources.hoverSurface is None:
+                ItemResources.hoverSurface = pygame.Surface(self.size)
+                ItemResources.hoverSurface.fill((220, 220, 220, 128))
+            self.__hoverImage = pygame.Surface(self.size)
+            self.__hoverImage.set_colorkey((0, 0, 0))
+            self.__hoverImage.blit(ItemResources.hoverSurface, (0, 0))
+            self.__hoverImage.blit(self.image, (0, 0))
+        return self.__hoverImage
+
+    @property
+    def info(self) -> pygame.Surface:
+        if self.__info is None:
+            name = fonts.get_font(30).render(self.definition.name, False, constants.WHITE)
+            self.__info = pygame.Surface((name.get_width() + 5, name.get_height()))
+            self.__info.fill(constants.BG_COLOR2)
+            self.__info.blit(name, name.get_rect(center=(self.__info.get_width() / 2, self.__info.get_height() / 2)))
+        return self.__info
+
+
+item_resources: dict[str, ItemResources] = {}
+
+
+def get_resources(definition: item_registry.ItemDefinition) -> ItemResources:
+    resources = item_resources.get(definition.key)
+    if resources is None:
+        resources = ItemResources(definition)
+        item_resources[definition.key] = resources
+    return resources
 
 
 class InventoryItem(pygame.sprite.Sprite):
@@ -31,45 +94,30 @@ class InventoryItem(pygame.sprite.Sprite):
         super().__init__(groups)
         self.position = pygame.math.Vector2(0, 0)
         self.item = item
-        self.defaultImage = pygame.transform.smoothscale(item.icon, (constants.TILE_SIZE * 2, constants.TILE_SIZE * 2))
-        self.image = self.defaultImage
+        self.resources = get_resources(item.definition)
+        self.image = self.resources.image
         self.rect = self.image.get_rect()
         self.quantity = 0
-        self.font = pygame.font.Font("../Assets/monogram.ttf", 30)
-        self.name = self.font.render(item.name, False, constants.WHITE)
-        self.nameRect = self.name.get_rect()
-        self.info = pygame.Surface((self.name.get_width() + 5, self.name.get_height()))
-        self.info.fill(constants.BG_COLOR2)
-        self.nameRect.center = (self.info.get_width() / 2, self.info.get_height() / 2)
-        self.info.blit(self.name, self.nameRect)
         self.infoRect = self.info.get_rect()
-        self.mask = pygame.mask.from_surface(self.image)
-
-        # self.hoverSurface = self.mask.to_surface()
-        # self.hoverSurface.set_colorkey((0, 0, 0))
-        # self.hoverSurface = pygame.transform.scale(self.hoverSurface,
-        #                                            (constants.TILE_SIZE * 2 + 5, constants.TILE_SIZE * 2 + 5))
-        # self.hoverSurfaceRect = self.hoverSurface.get_rect(center=(constants.TILE_SIZE-1, constants.TILE_SIZE-1))
-
-        self.hoverSurface = pygame.Surface((constants.TILE_SIZE * 2, constants.TILE_SIZE * 2))
-        self.hoverSurface.fill((220, 220, 220, 128))
-
-        self.newSurface = pygame.Surface((constants.TILE_SIZE * 2, constants.TILE_SIZE * 2))
-        self.newSurface.set_colorkey((0, 0, 0))
-        self.newSurface.blit(self.hoverSurface, (0, 0))
-        self.newSurface.blit(self.image, (0, 0))
-
-    def hover(self, game_canvas: pygame.Surface, offset: tuple, cursor_position: tuple):
-        rect = self.rect.copy()
-        rect.x += offset[0]
-        rect.y += offset[1]
-
-        if rect.collidepoint(cursor_position[0] / 2, cursor_position[1] / 2):
-            self.infoRect.bottomleft = (cursor_position[0] / 2, cursor_position[1] / 2)
-            game_canvas.blit(self.info, self.infoRect)
-            self.image = self.newSurface
-        else:
-            self.image = self.defaultImage
+
+    @property
+    def defaultImage(self) -> pygame.Surface:
+        return self.resources.image
+
+    @property
+    def newSurface(self) -> pygame.Surface:
+        return self.resources.hoverImage
+
+    @property
+    def mask(self) -> pygame.mask.Mask:
+        return self.resources.mask
+
+    @property
+    def info(self) -> pygame.Surface:
+        return self.resources.info
+
+    def set_hover(self, hovered: bool):
+        self.image = self.newSurface if hovered else self.defaultImage
 
     def update(self):
         self.rect.center = self.position
@@ -94,15 +142,38 @@ class Inventory(pygame.sprite.Sprite):
         self.columns = int(self.image.get_width() / self.cellSize)
         self.offset = self.position.x, self.position.y
         self.display = display
+        # Grid lines are drawn once on a colorkeyed overlay
+        self.grid = pygame.Surface(self.image.get_size())
+        self.grid.set_colorkey((0, 0, 0))
+        self.draw_grid()
+        # Set when items are added or removed, or an item image changes
+        self.layoutDirty = True
+        self.panelDirty = True
+        self.hovered: InventoryItem | None = None
+        # Last cursor position hover was resolved for, in display coordinates
+        self.cursor: tuple | None = None
 
     def draw_grid(self):
         for row in range(self.rows + 1):
-            pygame.draw.line(self.image, constants.WHITE, (0, row * self.cellSize),
+            pygame.draw.line(self.grid, constants.WHITE, (0, row * self.cellSize),
                              (self.columns * self.cellSize, row * self.cellSize))
         for column in range(self.columns + 1):
-            pygame.draw.line(self.image, constants.WHITE, (column * self.cellSize, 0),
+            pygame.draw.line(self.grid, constants.WHITE, (column * self.cellSize, 0),
                              (column * self.cellSize, self.rows * self.cellSize))
 
+    def add_item(self, item: Item) -> InventoryItem:
+        inventory_item = InventoryItem(item, self.itemsGroup)
+        self.items.append(inventory_item)
+        self.layoutDirty = True
+        return inventory_item
+
+    def remove_item(self, inventory_item: InventoryItem):
+        if inventory_item is self.hovered:
+            self.set_hovered(None)
+        self.items.remove(inventory_item)
+        inventory_item.kill()
+        self.layoutDirty = True
+
     def place_items(self):
         x = 0
         y = 0
@@ -113,19 +184,63 @@ class Inventory(pygame.sprite.Sprite):
 
             item.position.x = x + self.cellSize / 2
             item.position.y = y + self.cellSize / 2
+            item.update()
 
             x += self.cellSize
 
-    def check_hover(self):
-        cursor_position = pygame.mouse.get_pos()[0], pygame.mouse.get_pos()[1]
-        for item in self.items:
-            item.hover(self.display, self.offset, cursor_position)
+    def event_loop(self, event: pygame.event.Event):
+        # Optional, forwarding motion events resolves hover as soon as the cursor moves
+        if event.type == pygame.MOUSEMOTION:
+            self.check_hover(event.pos)
+
+    def item_at(self, cursor_position: tuple) -> InventoryItem | None:
+        # Items are laid out row by row, so the cell under the cursor gives the item index
+        x = cursor_position[0] / 2 - self.offset[0]
+        y = cursor_position[1] / 2 - self.offset[1]
+        if x < 0 or y < 0:
+            return None
+        column, row = int(x // self.cellSize), int(y // self.cellSize)
+        if column >= self.columns or row >= self.rows:
+            return None
+        index = row * self.columns + column
+        return self.items[index] if index < len(self.items) else None
+
+    def check_hover(self, cursor_position: tuple):
+        self.cursor = tuple(cursor_position)
+        item = self.item_at(cursor_position)
+        if item is not None:
+            item.infoRect.bottomleft = (cursor_position[0] / 2, cursor_position[1] / 2)
+        self.set_hovered(item)
+
+    def set_hovered(self, item: InventoryItem | None):
+        # Only the previously and newly hovered items change
+        if item is self.hovered:
+            return
+        if self.hovered is not None:
+            self.hovered.set_hover(False)
+        if item is not None:
+            item.set_hover(True)
+        self.hovered = item
+        self.panelDirty = True
 
     def update(self, dt: float):
-        self.image.fill(constants.BLUE)
-        self.check_hover()
-
-        self.place_items()
-        self.itemsGroup.draw(self.image)
-        self.itemsGroup.update()
-        self.draw_grid()
+        if self.layoutDirty:
+            self.place_items()
+            self.layoutDirty = False
+            self.panelDirty = True
+            # Other items may now be under a cursor that has not moved
+            if self.cursor is not None:
+                self.check_hover(self.cursor)
+        # Without forwarded events a moved cursor is picked up here, a still one costs a comparison
+        cursor = pygame.mouse.get_pos()
+        if cursor != self.cursor:
+            self.check_hover(cursor)
+
+        # The panel is only recomposited when something on it changed
+        if self.panelDirty:
+            self.image.fill(constants.BLUE)
+            self.itemsGroup.draw(self.image)
+            self.image.blit(self.grid, (0, 0))
+            self.panelDirty = False
+        if self.hovered is not None:
+            self.display.blit(self.hovered.info, self.hovered.infoRect)
@@ -0,0 +1,156 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import subprocess
+import time
+import pygame
+
+allocations = {"surfaces": 0, "renders": 0}
+
+
+class CountingSurface(pygame.Surface):
+    def __init__(self, *args, **kwargs):
+        allocations["surfaces"] += 1
+        super().__init__(*args, **kwargs)
+
+
+class CountingFont(pygame.font.Font):
+    def render(self, *args, **kwargs):
+        allocations["renders"] += 1
+        return super().render(*args, **kwargs)
+
+
+# Patched before the game modules create any font or surface
+pygame.Surface = CountingSurface
+pygame.font.Font = CountingFont
+
+import constants
+import dialogue_box
+import fonts
+import text_engine
+
+REPEATS = (1, 10, 100, 1000)
+BOX_POSITION = (0, constants.CANVAS_HEIGHT - 200)
+BOX_SIZE = (constants.CANVAS_WIDTH, 200)
+
+
+def reset_allocations():
+    allocations["surfaces"] = 0
+    allocations["renders"] = 0
+
+
+def bench_formatter(text: str) -> dict:
+    text_engine.word_widths.clear()
+    reset_allocations()
+    start = time.perf_counter()
+    lines = text_engine.TextWrapper(fonts.get_font(40), BOX_SIZE[0]).wrap(text)
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "lines": len(lines), **allocations}
+
+
+def bench_typewriter(text: str, speed: float, frames: int, dt: float) -> dict:
+    group = pygame.sprite.Group()
+    reset_allocations()
+    start = time.perf_counter()
+    box = dialogue_box.DialogueBox(text, BOX_POSITION, BOX_SIZE, group, speed=speed)
+    setup = time.perf_counter() - start
+    revealed = 0
+    frame = 0
+    start = time.perf_counter()
+    while frame < frames:
+        before = box.pastIndex
+        box.update(dt)
+        revealed += box.pastIndex - before
+        frame += 1
+        if box.done and box.next_lines():
+            break
+    elapsed = time.perf_counter() - start
+    return {"setup_seconds": setup, "frames": frame, "frame_seconds": elapsed / max(frame, 1),
+            "chars_per_second": revealed / elapsed if elapsed else 0.0, **allocations}
+
+
+def bench_text(frames: int) -> dict:
+    group = pygame.sprite.Group()
+    label = dialogue_box.Text("0,0", (0, 0), group)
+    results = {}
+    for name, values in (("static", ["(320, 180)"]), ("changing", [str((x, x)) for x in range(frames)])):
+        reset_allocations()
+        start = time.perf_counter()
+        for frame in range(frames):
+            label.text = values[frame % len(values)]
+            label.update(1 / 60)
+        elapsed = time.perf_counter() - start
+        results[name] = {"update_seconds": elapsed / frames, **allocations}
+    return results
+
+
+def run(args: argparse.Namespace) -> dict:
+    pygame.init()
+    pygame.display.set_mode((constants.WIDTH, constants.HEIGHT))
+    results = {"commit": git_commit(), "typewriter_speed": args.speed, "cases": {}}
+    for repeat in args.repeats:
+        text = "\n".join([constants.TEXT_TEST] * repeat)
+        results["cases"][str(repeat)] = {
+            "characters": len(text),
+            "formatter": bench_formatter(text),
+            "typewriter": bench_typewriter(text, args.speed, args.frames, 1 / 60),
+        }
+    results["text"] = bench_text(args.frames)
+    results["fonts_loaded"] = fonts.registry.loaded
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results: dict, baseline: dict | None):
+    for repeat, case in results["cases"].items():
+        line = (f"x{repeat:<5} chars={case['characters']:<8} "
+                f"format={case['formatter']['seconds'] * 1000:9.3f}ms "
+                f"frame={case['typewriter']['frame_seconds'] * 1e6:9.2f}us "
+                f"chars/s={case['typewriter']['chars_per_second']:12.0f} "
+                f"surfaces={case['typewriter']['surfaces']:<6} renders={case['typewriter']['renders']}")
+        if baseline is not None and repeat in baseline["cases"]:
+            old = baseline["cases"][repeat]
+            line += (f"  format x{ratio(case['formatter']['seconds'], old['formatter']['seconds'])}"
+                     f" frame x{ratio(case['typewriter']['frame_seconds'], old['typewriter']['frame_seconds'])}")
+        print(line)
+    for name, text in results["text"].items():
+        print(f"Text.update {name:<9} {text['update_seconds'] * 1e6:9.2f}us "
+              f"surfaces={text['surfaces']} renders={text['renders']}")
+    print(f"Fonts loaded: {results['fonts_loaded']}")
+
+
+def ratio(new: float, old: float) -> str:
+    return f"{new / old:.2f}" if old else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless text layout and typewriter benchmarks")
+    parser.add_argument("--repeats", type=int, nargs="+", default=list(REPEATS))
+    parser.add_argument("--speed", type=float, default=2400, help="typewriter characters per second")
+    parser.add_argument("--frames", type=int, default=2000, help="frames simulated per case")
+    parser.add_argument("--output", default="../bench_output.txt")
+    parser.add_argument("--compare", help="previous output file to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as data:
+            baseline = json.load(data)
+    results = run(args)
+    report(results, baseline)
+    with open(args.output, "w") as data:
+        json.dump(results, data, indent=2)
+
+
+if __name__ == '__main__':
+    main()
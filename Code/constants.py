@@ -7,6 +7,13 @@ CANVAS_HEIGHT = 360
 # Tile Size
 TILE_SIZE = 16
 INV_TILE_SIZE = 32
+INV_STACK_SIZE = 64
+# How quickly inventory grids ease towards their scroll target, per second
+INV_SCROLL_EASE = 12
+# Seconds between inventory autosaves
+AUTOSAVE_INTERVAL = 5
+# Rendering, redraw only the regions reported as changed
+DIRTY_RECTS = True
 # Colors
 BG_COLOR1 = "#2E242A"
 WATER = "#5c699f"
@@ -29,4 +36,4 @@ TEST_TEXT2 = """[i] Initializing ...
 
 done ...
 
-"""
+"""
\ No newline at end of file
@@ -1,10 +1,16 @@
+from typing import AsyncIterable, Iterable
 import pygame
 import ctypes
 import constants
+import fonts
+import text_engine
+import dirty_rects
+from spatial_hash import SpatialHash
 import time
 
 # Avoid DPI virtualization
-ctypes.windll.user32.SetProcessDPIAware()
+if hasattr(ctypes, "windll"):
+    ctypes.windll.user32.SetProcessDPIAware()
 
 
 class GameObject(pygame.sprite.Sprite):
@@ -15,6 +21,8 @@ class GameObject(pygame.sprite.Sprite):
         super().__init__(groups)
         self.key = key
         self.position = pygame.math.Vector2(position)
+        # Canvas areas changed without the rect moving, collected by the dirty rect pass
+        self.dirtyRects: list[pygame.Rect] = []
 
     def update(self, dt: float) -> None: ...
 
@@ -23,121 +31,195 @@ class GameObject(pygame.sprite.Sprite):
 
 
 class Text(GameObject):
-    def __init__(self, text: str, position: tuple, groups: pygame.sprite.Group | list[pygame.sprite.Group]):
+    def __init__(self, text: str, position: tuple, groups: pygame.sprite.Group | list[pygame.sprite.Group],
+                 color=constants.WHITE, size: int = 40):
         super().__init__("text", position, groups)
-        self.text = text
-        self.font = pygame.font.Font("../Assets/monogram.ttf", 40)
-        self.image = self.font.render(self.text, False, constants.WHITE)
+        self.__text = text
+        self.__color = color
+        self.__font = fonts.get_font(size)
+        self.dirty = True
+        self.render()
+
+    @property
+    def text(self):
+        return self.__text
+
+    @property
+    def color(self):
+        return self.__color
+
+    @property
+    def font(self):
+        return self.__font
+
+    @text.setter
+    def text(self, value: str):
+        if value != self.__text:
+            self.__text = value
+            self.dirty = True
+
+    @color.setter
+    def color(self, value):
+        if value != self.__color:
+            self.__color = value
+            self.dirty = True
+
+    @font.setter
+    def font(self, value: pygame.font.Font):
+        if value is not self.__font:
+            self.__font = value
+            self.dirty = True
+
+    def render(self):
+        if hasattr(self, "rect"):
+            self.dirtyRects.append(self.rect.copy())
+        self.image = text_engine.render_text(self.__font, self.__text, self.__color)
         self.rect = self.image.get_rect(topleft=self.position)
+        self.dirtyRects.append(self.rect.copy())
+        self.dirty = False
 
     def update(self, dt: float) -> None:
-        self.image = self.font.render(self.text, False, constants.WHITE)
+        if self.dirty:
+            self.render()
 
 
 class DialogueBox(GameObject):
-    def __init__(self, text: str, position: tuple, size: tuple,
-                 groups: pygame.sprite.Group | list[pygame.sprite.Group]):
+    def __init__(self, text: str | Iterable[str] | AsyncIterable[str], position: tuple, size: tuple,
+                 groups: pygame.sprite.Group | list[pygame.sprite.Group], threaded: bool = False,
+                 speed: float = 40):
         super().__init__("dialogue", position, groups)
-        self.text = text
+        self.stream = text_engine.TextStream(text, threaded)
         self.size = size
-        self.textBox = pygame.Surface(self.size)
-        self.textBox.fill(constants.BG_COLOR2)
-        self.speed = 40
+        self.speed = speed
+        # Markup like [color=yellow], [speed=10] and [pause=0.5] is compiled into per character runs
+        self.runs = text_engine.MarkupRuns(constants.WHITE, self.speed)
         self.counter = 0
         self.done = False
-        self.font = pygame.font.Font("../Assets/monogram.ttf", 40)
-        self.textImage = self.font.render(self.text, False, constants.WHITE)
-        self.image = pygame.Surface(self.textBox.get_size())
+        self.atlas = text_engine.get_atlas(40)
+        self.font = self.atlas.font
+        self.image = pygame.Surface(self.size)
         self.rect = self.image.get_rect(topleft=self.position)
-        # Create dictionary with lines and words per line
-        self.lines = [line.split(' ') for line in self.text.splitlines()]
-        self.spaceSize = self.font.size(" ")
-        self.maxWidth = self.textBox.get_width()
-        self.maxHeight = self.textBox.get_height()
-
-        self.formattedText = self.formatter(self.lines)
-        self.newText = self.convert_to_text(self.formatter(self.lines))
-        self.x = 0
-        self.y = 0
-        self.pastIndex = -1
-        self.maxLines = int(self.textBox.get_height() / self.spaceSize[1])
-        self.activeLines = self.formattedText[:self.maxLines]
-        self.remainingLines = self.formattedText[self.maxLines:]
+        self.maxWidth, self.maxHeight = self.size
+        self.wrapper = text_engine.TextWrapper(self.font, self.maxWidth)
+        self.paginator = text_engine.Paginator(self.font, self.size, constants.BG_COLOR2)
         self.indicator = pygame.Surface((30, 30))
         self.indicator.fill(constants.BLUE)
+        self.indicatorRect = self.indicator.get_rect(bottomright=self.image.get_rect().bottomright)
+        self.indicatorShown = False
+        # Areas of textBox that still have to be copied to image
+        self.changed: list[pygame.Rect] = []
+        # Set when a DialogueManager drives this box, along with the box's slot in its arrays
+        self.manager = None
+        self.managerIndex: int = None
+        # Text is wrapped and paginated as chunks arrive, only as far as the shown page needs
+        self.show_page(0)
         self.finished = False
 
-    def next_lines(self):
-        if len(self.remainingLines) > 0 and self.done:
-            self.textBox = pygame.Surface(self.size)
-            self.textBox.fill(constants.BG_COLOR2)
-
-            self.counter = 0
-            self.pastIndex = -1
+    def kill(self):
+        super().kill()
+        if self.manager is not None:
+            self.manager.remove(self)
+
+    def pull(self, page: int):
+        while not self.stream.exhausted and len(self.paginator.pages) <= page + 1:
+            chunk = self.stream.read()
+            if chunk is None:
+                break
+            self.wrapper.append(self.runs.feed(chunk))
+            self.paginator.extend(self.wrapper.new_lines())
+        if self.stream.exhausted:
+            self.wrapper.append(self.runs.finish())
+            self.wrapper.finish()
+            self.paginator.extend(self.wrapper.new_lines())
+
+    def extend_page(self):
+        start, end = self.paginator.pages[self.paginator.current]
+        if end - start > self.layout.lineCount:
+            self.layout.extend(self.paginator.lines[start + self.layout.lineCount:end])
             self.done = False
+            if self.indicatorShown:
+                self.changed.append(self.indicatorRect)
+                self.indicatorShown = False
+            if self.manager is not None:
+                self.manager.sync(self)
+
+    def show_page(self, index: int, reveal: bool = False):
+        self.pull(index)
+        # Page 0 may still be waiting for its first lines
+        if index < 0 or index >= max(len(self.paginator.pages), 1):
+            raise IndexError(f"page {index} out of range")
+        self.textBox = self.paginator.next_surface()
+        self.changed = [self.textBox.get_rect()]
+        self.indicatorShown = False
+        self.layout = text_engine.PageLayout(self.paginator.goto(index), self.atlas, constants.WHITE,
+                                             runs=self.runs, offset=self.paginator.offset(index))
+        self.counter = 0
+        self.pastIndex = 0
+        self.done = False
+        if reveal:
+            self.counter = self.layout.duration
+            self.reveal(self.layout.length)
+        if self.manager is not None:
+            self.manager.sync(self)
 
-            self.x = 0
-            self.y = 0
-
-            self.activeLines = self.remainingLines[:self.maxLines]
-            self.remainingLines = self.remainingLines[self.maxLines:]
-            print(f"Remaining: {len(self.remainingLines)}")
-        elif len(self.remainingLines) == 0 and self.done:
+    def next_lines(self):
+        if not self.done:
+            return
+        if self.paginator.has_next():
+            self.show_page(self.paginator.current + 1)
+        elif self.stream.exhausted:
             # self.finished = True
             self.kill()
             return True
 
+    def previous_lines(self):
+        if self.paginator.has_previous():
+            self.show_page(self.paginator.current - 1, reveal=True)
+
+    def goto_page(self, index: int, reveal: bool = False):
+        self.show_page(index, reveal)
+
+    def refill(self):
+        if not self.stream.exhausted:
+            self.pull(self.paginator.current)
+            if self.paginator.pages:
+                self.extend_page()
+
     def update(self, dt: float) -> None:
-        self.typewriter(self.activeLines, dt)
-        self.image.blit(self.textBox, (0, 0))
+        self.refill()
+        self.typewriter(dt)
+        self.present()
+
+    def present(self):
+        for area in self.changed:
+            self.image.blit(self.textBox, area, area)
+            self.dirtyRects.append(area.move(self.rect.topleft))
+        self.changed = []
+        if self.done and not self.indicatorShown:
+            self.image.blit(self.indicator, self.indicatorRect)
+            self.dirtyRects.append(self.indicatorRect.move(self.rect.topleft))
+            self.indicatorShown = True
+
+    def typewriter(self, dt: float):
         if self.done:
-            self.image.blit(self.indicator, (
-                self.image.get_width() - self.indicator.get_width(),
-                self.image.get_height() - self.indicator.get_height()))
-
-    def formatter(self, lines: list):
-        text = []
-        text_line = []
-        x, y = 0, 0
-        for line in lines:
-            for word in line:
-                word_width, word_height = self.font.size(word)
-                if x + word_width >= self.maxWidth:
-                    x = 0
-                    text.append(text_line)
-                    text_line = []
-                x += word_width + self.spaceSize[0]
-                text_line.append(word)
-            x = 0
-            text.append(text_line)
-            text_line = []
-        return text
-
-    def typewriter(self, lines: list, dt: float):
-        # Control
-        if not self.done:
-            self.counter += self.speed * dt
-            if self.counter >= len(self.convert_to_text(lines).replace("|", " ")):
-                self.done = True
-        # Render
-        if int(self.counter) != int(self.pastIndex) and not self.done:
-            char_surface = self.font.render(self.convert_to_text(lines).replace("|", " ")[int(self.counter)], False,
-                                            constants.WHITE)
-            if self.convert_to_text(lines)[int(self.counter)] == "|":
-                self.y += char_surface.get_height()
-                self.x = 0
-            else:
-                self.textBox.blit(char_surface, (self.x, self.y))
-                self.x += char_surface.get_width()
-            self.pastIndex = self.counter
-
-    @staticmethod
-    def convert_to_text(lines: list):
-        return "|".join([" ".join(line) for line in lines])
+            return
+        self.counter = min(self.counter + self.speed * dt, self.layout.duration)
+        self.reveal(self.layout.revealed_at(self.counter, self.pastIndex))
+
+    def reveal(self, revealed: int):
+        # Blit every glyph revealed since the last frame, however many there are
+        if revealed != self.pastIndex:
+            area = self.layout.blit(self.textBox, self.pastIndex, revealed)
+            if area is not None:
+                self.changed.append(area)
+            self.pastIndex = revealed
+        if revealed >= self.layout.length:
+            self.done = True
 
 
 class NPC(GameObject):
-    def __init__(self, position: tuple, groups: pygame.sprite.Group | list[pygame.sprite.Group]):
+    def __init__(self, position: tuple, groups: pygame.sprite.Group | list[pygame.sprite.Group],
+                 interactions: SpatialHash = None):
         super().__init__("NPC", position, groups)
         self.image = pygame.Surface((32, 32))
         self.image.fill(constants.YELLOW)
@@ -145,10 +227,25 @@ class NPC(GameObject):
         self.dialogue = constants.TEXT_TEST
         self.dialogueArea = self.rect.inflate(32, 32)
         self.dialogueArea.center = self.rect.center
+        self.interactions = interactions
+        if self.interactions is not None:
+            self.interactions.insert(self, self.dialogueArea)
 
-    def start_dialogue(self, group: pygame.sprite.Group):
-        DialogueBox(self.dialogue, (0, constants.CANVAS_HEIGHT - 200),
-                    (constants.CANVAS_WIDTH, 200), group)
+    def set_position(self, position: tuple):
+        super().set_position(position)
+        self.rect.center = self.position
+        self.dialogueArea.center = self.rect.center
+        if self.interactions is not None:
+            self.interactions.move(self, self.dialogueArea)
+
+    def kill(self):
+        super().kill()
+        if self.interactions is not None:
+            self.interactions.remove(self)
+
+    def start_dialogue(self, group: pygame.sprite.Group) -> DialogueBox:
+        return DialogueBox(self.dialogue, (0, constants.CANVAS_HEIGHT - 200),
+                           (constants.CANVAS_WIDTH, 200), group)
 
 
 class Player(GameObject):
@@ -191,15 +288,12 @@ class Player(GameObject):
         self.position.y += self.direction.y * self.movementSpeed * dt
         self.rect.centery = round(self.position.y)
 
-    def check_dialogue(self, group: pygame.sprite.Group):
-        for sprite in group:
-            sprite: GameObject
-            if sprite.key == "NPC":
-                sprite: NPC
-                if self.rect.colliderect(sprite.dialogueArea):
-                    sprite.start_dialogue(group)
-                    return True
-        return False
+    def check_dialogue(self, group: pygame.sprite.Group, interactions: SpatialHash) -> DialogueBox | None:
+        # Only NPCs registered in the cells around the player are checked
+        for npc in interactions.query(self.rect):
+            npc: NPC
+            return npc.start_dialogue(group)
+        return None
 
     def update(self, dt: float) -> None:
         self.move(dt)
@@ -217,20 +311,29 @@ class Game:
         self.dialogueActive = False
         self.coords = Text("0,0", (0, 0), self.sprites)
         self.box = None
-        NPC((10, 10), self.sprites)
+        self.interactions = SpatialHash(64)
+        NPC((10, 10), self.sprites, self.interactions)
+        self.dirty = dirty_rects.DirtyRegions(self.gameCanvas.get_rect())
+        self.spriteRects: dict[GameObject, pygame.Rect] = {}
 
-    def render(self):
-        # Blit the game canvas on display
-        self.display.blit(pygame.transform.scale(self.gameCanvas, (constants.WIDTH, constants.HEIGHT)), (0, 0))
+    def render(self, regions: list[pygame.Rect]):
+        # Blit the redrawn canvas regions on display
+        dirty_rects.present(self.gameCanvas, self.display, regions)
 
     def draw(self):
-        self.gameCanvas.fill(constants.BG_COLOR1)
+        if not constants.DIRTY_RECTS:
+            self.dirty.invalidate()
+        dirty_rects.redraw(self.gameCanvas, self.dirty.regions(), self.draw_region)
+        self.render(self.dirty.flush())
+
+    def draw_region(self, rect: pygame.Rect):
+        self.gameCanvas.fill(constants.BG_COLOR1, rect)
         self.sprites.draw(self.gameCanvas)
-        self.render()
 
     def update(self):
         self.coords.text = str(pygame.mouse.get_pos())
         self.sprites.update(self.clock.tick() / 1000)
+        self.spriteRects = dirty_rects.track_sprites(self.sprites, self.spriteRects, self.dirty)
 
     def run(self):
         while self.running:
@@ -242,7 +345,8 @@ class Game:
                 if event.type == pygame.KEYDOWN:
                     if pygame.key.get_pressed()[pygame.K_SPACE]:
                         if not self.dialogueActive:
-                            if self.player.check_dialogue(self.sprites):
+                            self.box = self.player.check_dialogue(self.sprites, self.interactions)
+                            if self.box is not None:
                                 self.dialogueActive = True
 
 
@@ -259,7 +363,6 @@ class Game:
                 self.player.input()
             self.update()
             self.draw()
-            pygame.display.update()
 
 
 if __name__ == '__main__':
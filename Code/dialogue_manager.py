@@ -0,0 +1,104 @@
+import numpy
+import pygame
+from dialogue_box import DialogueBox
+
+
+class DialogueManager:
+    def __init__(self, capacity: int = 64, linger: float = 2.0):
+        self.boxes: list[DialogueBox] = []
+        self.linger = linger
+        # One slot per box, boxes are kept packed at the front of every array
+        self.counters = numpy.zeros(capacity)
+        self.speeds = numpy.zeros(capacity)
+        self.durations = numpy.zeros(capacity)
+        # Counter value at which each box shows its next character, infinite once the page is done
+        self.thresholds = numpy.zeros(capacity)
+        self.lingers = numpy.zeros(capacity)
+        # Boxes that changed outside the batched step and still have to be presented
+        self.synced: set[DialogueBox] = set()
+        self.streaming: set[DialogueBox] = set()
+        self.dirtyRects: list[pygame.Rect] = []
+
+    def add(self, box: DialogueBox) -> DialogueBox:
+        if len(self.boxes) == len(self.counters):
+            self.grow()
+        box.managerIndex = len(self.boxes)
+        box.manager = self
+        self.boxes.append(box)
+        if not box.stream.exhausted:
+            self.streaming.add(box)
+        self.sync(box)
+        return box
+
+    def grow(self):
+        for name in ("counters", "speeds", "durations", "thresholds", "lingers"):
+            array = getattr(self, name)
+            setattr(self, name, numpy.concatenate((array, numpy.zeros_like(array))))
+
+    def sync(self, box: DialogueBox):
+        # Copies the state of a box that was changed directly, like a page turn
+        index = box.managerIndex
+        self.counters[index] = box.counter
+        self.speeds[index] = box.speed
+        self.durations[index] = box.layout.duration
+        self.thresholds[index] = box.layout.threshold(box.pastIndex)
+        self.lingers[index] = self.linger
+        self.synced.add(box)
+
+    def remove(self, box: DialogueBox):
+        # Swap the last box into the freed slot so the arrays stay packed
+        index = box.managerIndex
+        last = len(self.boxes) - 1
+        moved = self.boxes[last]
+        self.boxes[index] = moved
+        moved.managerIndex = index
+        for array in (self.counters, self.speeds, self.durations, self.thresholds, self.lingers):
+            array[index] = array[last]
+        self.boxes.pop()
+        self.synced.discard(box)
+        self.streaming.discard(box)
+        box.manager = None
+        self.dirtyRects.append(box.rect.copy())
+
+    def update(self, dt: float):
+        for box in list(self.streaming):
+            box.refill()
+            if box.stream.exhausted:
+                self.streaming.discard(box)
+
+        count = len(self.boxes)
+        counters = self.counters[:count]
+        thresholds = self.thresholds[:count]
+        numpy.minimum(counters + self.speeds[:count] * dt, self.durations[:count], out=counters)
+        changed = numpy.flatnonzero(counters >= thresholds)
+
+        presented = self.synced
+        self.synced = set()
+        for index in changed.tolist():
+            box = self.boxes[index]
+            box.counter = float(counters[index])
+            box.reveal(box.layout.revealed_at(box.counter, box.pastIndex))
+            thresholds[index] = box.layout.threshold(box.pastIndex)
+            presented.add(box)
+        for box in presented:
+            box.present()
+            self.dirtyRects.extend(box.dirtyRects)
+            box.dirtyRects.clear()
+
+        # Finished pages wait for the linger time, then turn or retire the box
+        lingers = self.lingers[:count]
+        lingers -= dt * numpy.isinf(thresholds)
+        for index in sorted(numpy.flatnonzero(lingers <= 0).tolist(), reverse=True):
+            box = self.boxes[index]
+            if box.paginator.has_next():
+                box.show_page(box.paginator.current + 1)
+            elif box.stream.exhausted:
+                box.kill()
+            else:
+                self.lingers[index] = self.linger
+
+    def draw(self, surface: pygame.Surface):
+        surface.blits([(box.image, box.rect) for box in self.boxes], False)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
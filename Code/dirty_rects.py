@@ -0,0 +1,99 @@
+import pygame
+
+# Above this share of the canvas a single full redraw is cheaper than many small ones
+FULL_REDRAW_RATIO = 0.5
+
+
+class DirtyRegions:
+    def __init__(self, bounds: pygame.Rect):
+        self.bounds = pygame.Rect(bounds)
+        self.rects: list[pygame.Rect] = []
+        self.full = True
+        self.merged: list[pygame.Rect] | None = None
+
+    def add(self, rect: pygame.Rect):
+        if self.full:
+            return
+        rect = self.bounds.clip(rect)
+        if rect.width and rect.height:
+            self.rects.append(rect)
+            self.merged = None
+
+    def invalidate(self):
+        self.full = True
+        self.rects = []
+        self.merged = None
+
+    def regions(self) -> list[pygame.Rect]:
+        if self.full:
+            return [self.bounds.copy()]
+        if self.merged is None:
+            self.merged = self.merge(self.rects)
+            if sum(rect.width * rect.height for rect in self.merged) > \
+                    self.bounds.width * self.bounds.height * FULL_REDRAW_RATIO:
+                self.merged = [self.bounds.copy()]
+        return self.merged
+
+    def flush(self) -> list[pygame.Rect]:
+        regions = self.regions()
+        self.rects = []
+        self.merged = None
+        self.full = False
+        return regions
+
+    @staticmethod
+    def merge(rects: list[pygame.Rect]) -> list[pygame.Rect]:
+        merged: list[pygame.Rect] = []
+        for rect in rects:
+            rect = rect.copy()
+            index = rect.collidelist(merged)
+            # Overlapping rects are folded together until the new one touches nothing
+            while index != -1:
+                rect.union_ip(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+
+def track_sprites(sprites: pygame.sprite.AbstractGroup, previous_rects: dict, dirty: DirtyRegions) -> dict:
+    # Marks where sprites moved from and to, what they reported as changed and where removed sprites used to be
+    rects = {}
+    for sprite in sprites:
+        previous = previous_rects.pop(sprite, None)
+        if previous != sprite.rect:
+            dirty.add(sprite.rect)
+            if previous is not None:
+                dirty.add(previous)
+        changed = getattr(sprite, "dirtyRects", None)
+        if changed:
+            for rect in changed:
+                dirty.add(rect)
+            changed.clear()
+        rects[sprite] = sprite.rect.copy()
+    for previous in previous_rects.values():
+        dirty.add(previous)
+    return rects
+
+
+def redraw(surface: pygame.Surface, regions: list[pygame.Rect], draw):
+    # Calls draw once per region with drawing clipped to it
+    clip = surface.get_clip()
+    for rect in regions:
+        surface.set_clip(rect)
+        draw(rect)
+    surface.set_clip(clip)
+
+
+def present(canvas: pygame.Surface, display: pygame.Surface, regions: list[pygame.Rect]) -> list[pygame.Rect]:
+    # Scale only the dirty canvas regions onto the display and push them to the screen
+    scale_x = display.get_width() / canvas.get_width()
+    scale_y = display.get_height() / canvas.get_height()
+    updated = []
+    for rect in regions:
+        target = pygame.Rect(round(rect.x * scale_x), round(rect.y * scale_y),
+                             round(rect.width * scale_x), round(rect.height * scale_y)).clip(display.get_rect())
+        if target.width and target.height:
+            pygame.transform.scale(canvas.subsurface(rect), target.size, display.subsurface(target))
+            updated.append(target)
+    pygame.display.update(updated)
+    return updated
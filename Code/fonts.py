@@ -0,0 +1,30 @@
+import pygame
+
+FONT_PATH = "../Assets/monogram.ttf"
+
+
+class FontRegistry:
+    def __init__(self):
+        self.fonts: dict[tuple[str, int], pygame.font.Font] = {}
+
+    def get(self, size: int, path: str = FONT_PATH) -> pygame.font.Font:
+        # Faces are loaded on first use and shared afterwards
+        font = self.fonts.get((path, size))
+        if font is None:
+            font = pygame.font.Font(path, size)
+            self.fonts[(path, size)] = font
+        return font
+
+    @property
+    def loaded(self) -> int:
+        return len(self.fonts)
+
+    def clear(self):
+        self.fonts.clear()
+
+
+registry = FontRegistry()
+
+
+def get_font(size: int, path: str = FONT_PATH) -> pygame.font.Font:
+    return registry.get(size, path)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import pygame
+
+ATLAS_PATH = "../Data/items.atlas"
+ATLAS_WIDTH = 512
+ATLAS_VERSION = 1
+ICON_PADDING = 1
+
+# Magic, version, source signature, atlas width and height, icon count
+HEADER = struct.Struct("<4sH20sHHI")
+# Longest item key an entry can hold
+KEY_SIZE = 32
+# Item key and its rect in the atlas
+ENTRY = struct.Struct(f"<{KEY_SIZE}sHHHH")
+
+
+class IconAtlas:
+    def __init__(self, surface: pygame.Surface, rects: dict[str, pygame.Rect], buffer=None):
+        self.surface = surface
+        self.rects = rects
+        # Keeps the mapped file alive while the surface reads from it
+        self.buffer = buffer
+
+    def icon(self, key: str) -> pygame.Surface:
+        return self.surface.subsurface(self.rects[key])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rects
+
+
+def icon_paths(items_path: str) -> tuple[bytes, dict[str, str]]:
+    with open(items_path, "rb") as data:
+        raw = data.read()
+    return raw, {key: value["iconPath"] for key, value in json.loads(raw).items()}
+
+
+def signature(raw: bytes, paths: dict[str, str]) -> bytes:
+    # The catalog content plus the mtime and size of every icon it points to
+    digest = hashlib.sha1(raw)
+    for path in sorted(set(paths.values())):
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.digest()
+
+
+def pack(sizes: dict[str, tuple[int, int]], width: int = ATLAS_WIDTH) -> tuple[dict[str, pygame.Rect], int]:
+    # Shelf packing, tallest icons first so shelves waste little height
+    rects = {}
+    x = y = shelf = 0
+    for key, (w, h) in sorted(sizes.items(), key=lambda item: -item[1][1]):
+        if x + w > width:
+            x, y = 0, y + shelf + ICON_PADDING
+            shelf = 0
+        rects[key] = pygame.Rect(x, y, w, h)
+        x += w + ICON_PADDING
+        shelf = max(shelf, h)
+    return rects, y + shelf
+
+
+def build(items_path: str, atlas_path: str = ATLAS_PATH) -> IconAtlas:
+    raw, paths = icon_paths(items_path)
+    decoded = {path: pygame.image.load(path) for path in set(paths.values())}
+    widths = [image.get_width() for image in decoded.values()]
+    width = max(max(widths, default=1), min(ATLAS_WIDTH, sum(widths) + ICON_PADDING * len(widths)))
+    rects, height = pack({path: image.get_size() for path, image in decoded.items()}, width)
+    surface = pygame.Surface((width, max(height, 1)), pygame.SRCALPHA)
+    for path, image in decoded.items():
+        surface.blit(image, rects[path])
+    rects = {key: rects[path] for key, path in paths.items()}
+    try:
+        save(atlas_path, signature(raw, paths), surface, rects)
+    except OSError:
+        pass
+    return IconAtlas(surface, rects)
+
+
+def save(atlas_path: str, source: bytes, surface: pygame.Surface, rects: dict[str, pygame.Rect]):
+    for key in rects:
+        if len(key.encode()) > KEY_SIZE:
+            raise ValueError(f"item key {key!r} is longer than {KEY_SIZE} bytes")
+    with open(atlas_path + ".tmp", "wb") as file:
+        file.write(HEADER.pack(b"ICAT", ATLAS_VERSION, source, surface.get_width(), surface.get_height(),
+                               len(rects)))
+        for key, rect in rects.items():
+            file.write(ENTRY.pack(key.encode(), *rect))
+        file.write(pygame.image.tobytes(surface, "RGBA"))
+    os.replace(atlas_path + ".tmp", atlas_path)
+
+
+def read(atlas_path: str, source: bytes) -> IconAtlas | None:
+    # Maps the cache file, the pixels are used in place without decoding
+    try:
+        with open(atlas_path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < HEADER.size:
+        return None
+    magic, version, stored, width, height, count = HEADER.unpack_from(mapped, 0)
+    offset = HEADER.size + count * ENTRY.size
+    if magic != b"ICAT" or version != ATLAS_VERSION or stored != source or len(mapped) != offset + width * height * 4:
+        return None
+    rects = {}
+    for index in range(count):
+        key, x, y, w, h = ENTRY.unpack_from(mapped, HEADER.size + index * ENTRY.size)
+        rects[key.rstrip(b"\0").decode()] = pygame.Rect(x, y, w, h)
+    pixels = memoryview(mapped)[offset:]
+    return IconAtlas(pygame.image.frombuffer(pixels, (width, height), "RGBA"), rects, mapped)
+
+
+def load(items_path: str, atlas_path: str = ATLAS_PATH) -> IconAtlas:
+    raw, paths = icon_paths(items_path)
+    atlas = read(atlas_path, signature(raw, paths)) or build(items_path, atlas_path)
+    if pygame.display.get_surface() is not None:
+        # One converted copy for fast blits, icons stay subsurfaces of it
+        atlas = IconAtlas(atlas.surface.convert_alpha(), atlas.rects)
+    return atlas
+
+
+if __name__ == '__main__':
+    import item_registry
+    built = build(item_registry.ITEMS_PATH)
+    print(f"Packed {len(built.rects)} icons into a {built.surface.get_width()}x{built.surface.get_height()} atlas")
@@ -1,7 +1,13 @@
+import heapq
 import pygame
 import scene
 import constants
-import json
+import fonts
+import item_registry
+import text_engine
+import item_search
+import save
+from dirty_rects import redraw
 from enum import Enum
 
 
@@ -14,145 +20,496 @@ class ItemId(Enum):
 
 
 class Item:
-    name: str
-    description: str
-    icon: pygame.Surface
+    # Per instance state only, the definition data and icon are shared through the registry
+    __slots__ = ("id", "definition", "dragging")
 
     def __init__(self, item_id: ItemId):
+        self.id = item_id
+        self.definition = item_registry.registry.get(item_id.value)
         self.dragging = False
-        with open("../Data/items.json") as data:
-            items_data = json.load(data)
-        self.name = items_data[item_id.value]["name"]
-        self.description = items_data[item_id.value]["description"]
-        self.icon = pygame.image.load(items_data[item_id.value]["iconPath"]).convert_alpha()
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+    @property
+    def description(self) -> str:
+        return self.definition.description
+
+    @property
+    def icon(self) -> pygame.Surface:
+        return self.definition.icon
+
+
+def item_from_key(key: str) -> Item:
+    # Raises ValueError for keys that are not an ItemId
+    return Item(ItemId(key))
 
 
 class Inventory:
-    def __init__(self):
+    def __init__(self, size: int = 0, stack_size: int = constants.INV_STACK_SIZE):
+        # Quantity view, total per item id
         self.items: dict[str, int] = {}
+        # Slot view
+        self.slots: list[Item | None] = []
+        self.quantities: list[int] = []
+        self.stackSize = stack_size
+        self.itemSlots: dict[Item, int] = {}
+        # Slots holding each item id, and those of them that still have room
+        self.idSlots: dict[str, set[int]] = {}
+        self.openStacks: dict[str, set[int]] = {}
+        # Min-heap of free slots, entries are checked when popped so taken slots may linger
+        self.free: list[int] = []
+        # One byte per slot, set while its index is in the heap so it is never queued twice
+        self.queued = bytearray()
+        self.listeners: list = []
+        self.extend(size)
+
+    def extend(self, count: int):
+        start = len(self.slots)
+        self.slots.extend([None] * count)
+        self.quantities.extend([0] * count)
+        self.queued.extend(b"\1" * count)
+        for index in range(start, start + count):
+            heapq.heappush(self.free, index)
+
+    def add_item(self, item_id: ItemId, quantity: int) -> int:
+        # Fills the open stacks of the same id first, returns what did not fit
+        for index in list(self.openStacks.get(item_id.value, ())):
+            if quantity <= 0:
+                break
+            quantity -= self.fill(index, quantity)
+        while quantity > 0:
+            index = self.first_free()
+            if index is None:
+                break
+            added = min(quantity, self.stackSize)
+            self.set_slot(index, Item(item_id), added)
+            quantity -= added
+        return quantity
+
+    def remove_item(self, item_id: ItemId, quantity: int) -> int:
+        removed = 0
+        for index in list(self.idSlots.get(item_id.value, ())):
+            if removed >= quantity:
+                break
+            taken = min(quantity - removed, self.quantities[index])
+            self.set_quantity(index, self.quantities[index] - taken)
+            removed += taken
+        return removed
+
+    def has_item(self, item_id: ItemId) -> bool:
+        return item_id.value in self.items
+
+    def quantity(self, item_id: ItemId) -> int:
+        return self.items.get(item_id.value, 0)
+
+    def slot_of(self, item: Item) -> int | None:
+        return self.itemSlots.get(item)
+
+    def first_free(self) -> int | None:
+        while self.free and self.slots[self.free[0]] is not None:
+            self.queued[heapq.heappop(self.free)] = 0
+        return self.free[0] if self.free else None
+
+    def place(self, index: int, item: Item, quantity: int = 1) -> bool:
+        if self.slots[index] is not None:
+            return False
+        self.set_slot(index, item, quantity)
+        return True
 
-    def add_item(self, item_id: ItemId, quantity: int):
-        if self.has_item(item_id):
-            self.items[item_id.value] += quantity
+    def take(self, index: int) -> tuple[Item | None, int]:
+        item, quantity = self.slots[index], self.quantities[index]
+        if item is not None:
+            self.set_slot(index, None, 0)
+        return item, quantity
+
+    def move(self, source: int, target: int):
+        item, quantity = self.slots[source], self.quantities[source]
+        if source == target or item is None:
+            return
+        other = self.slots[target]
+        if other is None:
+            self.take(source)
+            self.set_slot(target, item, quantity)
+        elif other.id == item.id:
+            self.set_quantity(source, quantity - self.fill(target, quantity))
+        else:
+            other_quantity = self.quantities[target]
+            self.set_slot(target, item, quantity)
+            self.set_slot(source, other, other_quantity)
+
+    def fill(self, index: int, quantity: int) -> int:
+        added = min(quantity, self.stackSize - self.quantities[index])
+        if added > 0:
+            self.set_quantity(index, self.quantities[index] + added)
+        return added
+
+    def set_slot(self, index: int, item: Item | None, quantity: int):
+        old = self.slots[index]
+        if old is not None:
+            key = old.id.value
+            self.count(key, -self.quantities[index])
+            if self.itemSlots.get(old) == index:
+                del self.itemSlots[old]
+            self.idSlots[key].discard(index)
+            self.openStacks[key].discard(index)
+        self.slots[index] = item
+        self.quantities[index] = 0
+        if item is None:
+            if not self.queued[index]:
+                self.queued[index] = 1
+                heapq.heappush(self.free, index)
+            self.notify(index)
         else:
-            self.items[item_id.value] = quantity
+            self.itemSlots[item] = index
+            self.idSlots.setdefault(item.id.value, set()).add(index)
+            self.openStacks.setdefault(item.id.value, set())
+            self.set_quantity(index, quantity)
 
-    def remove_item(self, item_id: ItemId, quantity: int):
-        if self.has_item(item_id):
-            if self.items[item_id.value] - quantity < 0:
-                self.items[item_id.value] = 0
-            else:
-                self.items[item_id.value] -= quantity
+    def set_quantity(self, index: int, quantity: int):
+        item = self.slots[index]
+        if quantity <= 0:
+            self.set_slot(index, None, 0)
+            return
+        key = item.id.value
+        self.count(key, quantity - self.quantities[index])
+        self.quantities[index] = quantity
+        if quantity < self.stackSize:
+            self.openStacks[key].add(index)
+        else:
+            self.openStacks[key].discard(index)
+        self.notify(index)
+
+    def count(self, key: str, delta: int):
+        total = self.items.get(key, 0) + delta
+        if total > 0:
+            self.items[key] = total
+        else:
+            self.items.pop(key, None)
 
-    def has_item(self, item_id: ItemId):
-        return item_id.value in self.items.keys()
+    def notify(self, index: int):
+        for listener in self.listeners:
+            listener(index)
 
 
 class InventorySlot:
     def __init__(self, position: tuple):
         self.position = pygame.math.Vector2(position)
+        self.index: int = None
         self.item: Item = None
+        self.quantity = 0
+        # Cleared for slots whose item does not match the current search
+        self.matches = True
         self.rect = pygame.Rect(self.position.x, self.position.y, constants.INV_TILE_SIZE, constants.INV_TILE_SIZE)
 
     def draw(self, display: pygame.Surface):
-        pygame.draw.rect(display, constants.WHITE, self.rect)
+        pygame.draw.rect(display, constants.WHITE if self.matches else constants.GRAY, self.rect)
 
     def draw_item(self, display: pygame.Surface):
-        if self.item is not None and not self.item.dragging:
-            image = pygame.transform.scale(self.item.icon, (constants.INV_TILE_SIZE, constants.INV_TILE_SIZE))
-            display.blit(image, self.position)
-        if self.item is not None and self.item.dragging:
-            mouse_position = pygame.math.Vector2(pygame.mouse.get_pos()[0], pygame.mouse.get_pos()[1]) / 2
-            image = pygame.transform.scale(self.item.icon, (constants.INV_TILE_SIZE, constants.INV_TILE_SIZE))
-            display.blit(image, mouse_position - (self.rect.width / 2, self.rect.height / 2))
+        if self.item is None or self.item.dragging:
+            return
+        display.blit(item_registry.scaled_icon(self.item.definition, (constants.INV_TILE_SIZE, constants.INV_TILE_SIZE)),
+                     self.position)
+        if self.quantity > 1:
+            label = text_engine.render_text(fonts.get_font(16), str(self.quantity), constants.BG_COLOR2)
+            display.blit(label, label.get_rect(bottomright=self.rect.bottomright))
+
+
+class GridRow:
+    # A strip of slot views bound to whichever grid row is on screen, recycled as rows scroll in and out
+    def __init__(self, columns: int, pitch: int):
+        self.row: int = None
+        self.slots = [InventorySlot((column * pitch, 0)) for column in range(columns)]
+        # Opaque, the padding between slots is baked in with the scene background
+        self.surface = pygame.Surface((columns * pitch, constants.INV_TILE_SIZE))
+
+    def render(self):
+        self.surface.fill(constants.BG_COLOR1)
+        for slot in self.slots:
+            slot.draw(self.surface)
+            slot.draw_item(self.surface)
+
+    def render_slot(self, slot: InventorySlot):
+        self.surface.fill(constants.BG_COLOR1, slot.rect)
+        slot.draw(self.surface)
+        slot.draw_item(self.surface)
+
+
+class SlotGrid:
+    def __init__(self, origin: tuple, rows: int, columns: int, tile_size: int, padding: int,
+                 visible_rows: int = None):
+        self.origin = pygame.math.Vector2(origin)
+        self.rows = rows
+        self.columns = columns
+        self.tileSize = tile_size
+        self.pitch = tile_size + padding
+        self.visibleRows = rows if visible_rows is None else min(visible_rows, rows)
+        # The rect is the viewport, the cells only exist as inventory slots from start onwards
+        self.rect = pygame.Rect(origin, (columns * self.pitch - padding, self.visibleRows * self.pitch - padding))
+        self.start = 0
+        self.scroll = 0.0
+        self.scrollTarget = 0.0
+        self.maxScroll = rows * self.pitch - padding - self.rect.height
+        self.rowViews: dict[int, GridRow] = {}
+        self.spareRows: list[GridRow] = []
+        self.results: item_search.SearchResults | None = None
+
+    @property
+    def size(self) -> int:
+        return self.rows * self.columns
+
+    def index_at(self, position: tuple) -> int | None:
+        # Row and column come straight from the offset, points in the padding gaps hit nothing
+        if not self.rect.collidepoint(position):
+            return None
+        x = position[0] - self.origin.x
+        y = position[1] - self.origin.y + self.scroll
+        column, offset_x = divmod(int(x), self.pitch)
+        row, offset_y = divmod(int(y), self.pitch)
+        if column >= self.columns or row >= self.rows or offset_x >= self.tileSize or offset_y >= self.tileSize:
+            return None
+        return self.start + row * self.columns + column
+
+    def visible_range(self) -> range:
+        first = int(self.scroll // self.pitch)
+        last = min(self.rows, int(-(-(self.scroll + self.rect.height) // self.pitch)))
+        return range(first, last)
+
+    def layout(self, inventory: Inventory):
+        # Rows that left the viewport hand their surface over to the rows entering it
+        visible = self.visible_range()
+        for row in [row for row in self.rowViews if row not in visible]:
+            self.spareRows.append(self.rowViews.pop(row))
+        for row in visible:
+            if row not in self.rowViews:
+                view = self.spareRows.pop() if self.spareRows else GridRow(self.columns, self.pitch)
+                self.bind(view, row, inventory)
+                self.rowViews[row] = view
+
+    def bind(self, view: GridRow, row: int, inventory: Inventory):
+        view.row = row
+        for column, slot in enumerate(view.slots):
+            slot.index = self.start + row * self.columns + column
+            self.sync(slot, inventory)
+        view.render()
+
+    def sync(self, slot: InventorySlot, inventory: Inventory):
+        slot.item = inventory.slots[slot.index]
+        slot.quantity = inventory.quantities[slot.index]
+        slot.matches = self.results is None or slot.item is None or slot.item.id.value in self.results
+
+    def refresh(self, inventory: Inventory):
+        for row, view in self.rowViews.items():
+            self.bind(view, row, inventory)
+
+    def view_of(self, index: int) -> tuple[GridRow, InventorySlot] | None:
+        # Slots scrolled out of view have no view to update
+        row, column = divmod(index - self.start, self.columns)
+        view = self.rowViews.get(row)
+        return None if view is None else (view, view.slots[column])
+
+    def slot_rect(self, slot: InventorySlot, row: int) -> pygame.Rect:
+        return slot.rect.move(self.origin.x, self.row_y(row)).clip(self.rect)
+
+    def row_y(self, row: int) -> int:
+        return int(self.origin.y + row * self.pitch - self.scroll)
+
+    def scroll_by(self, delta: float):
+        self.scrollTarget = min(max(self.scrollTarget + delta, 0), max(self.maxScroll, 0))
+
+    def update(self, dt: float) -> bool:
+        # Eases towards the target offset, returns whether the view moved
+        if self.scroll == self.scrollTarget:
+            return False
+        self.scroll += (self.scrollTarget - self.scroll) * min(1, constants.INV_SCROLL_EASE * dt)
+        if abs(self.scrollTarget - self.scroll) < 0.5:
+            self.scroll = self.scrollTarget
+        return True
+
+    def draw(self, display: pygame.Surface):
+        clip = display.get_clip()
+        display.set_clip(clip.clip(self.rect))
+        for row, view in self.rowViews.items():
+            display.blit(view.surface, (self.origin.x, self.row_y(row)))
+        display.set_clip(clip)
 
 
 class SceneInventory(scene.Scene):
-    def __init__(self, display: pygame.Surface, target):
+    def __init__(self, display: pygame.Surface, target, rows: int = 4, columns: int = 9, visible_rows: int = None,
+                 save_path: str = None):
         super().__init__("inventory", display)
-        self.rows = 4
-        self.columns = 9
-        self.slots: list[InventorySlot] = []
+        self.rows = rows
+        self.columns = columns
+        self.visibleRows = visible_rows
+        self.grids: list[SlotGrid] = []
         self.target = target
         self.padding = 2
+        self.inventory = Inventory()
+        self.inventory.listeners.append(self.sync_slot)
         self.movingItem: Item = None
-        self.movingSlot: InventorySlot = None
+        self.movingIndex: int = None
+        self.ghostRect: pygame.Rect = None
+        self.ghostPosition = pygame.math.Vector2()
+        # Indexed up front so the first keystroke does not pay for it
+        self.search = item_search.ItemSearch()
+        self.search.build()
+        self.query = ""
         self.set_slots()
+        self.save = None
+        self.autosaveTimer = 0.0
+        if save_path is not None:
+            self.save = save.InventorySave(self.inventory, item_from_key, save_path)
+            self.save.load()
 
     def event_loop(self, manager: scene.SceneManager, event: pygame.event.Event) -> None:
         if event.type == pygame.KEYDOWN:
             self.input(event)
+        # Digits add items, letters and spaces type into the search
+        if event.type == pygame.TEXTINPUT and (event.text.isalpha() or event.text == " "):
+            self.set_filter(self.query + event.text)
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            self.drag_item()
+            self.drag_item(pygame.math.Vector2(event.pos) / 2)
         if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
-            self.place_item()
+            self.place_item(pygame.math.Vector2(event.pos) / 2)
+        if event.type == pygame.MOUSEWHEEL:
+            self.scroll(pygame.math.Vector2(pygame.mouse.get_pos()) / 2, -event.y)
+        if event.type == pygame.QUIT and self.save is not None:
+            self.save.autosave()
 
     def input(self, event: pygame.event.Event) -> None:
         key = pygame.key.name(event.key)
         item_ids = [item.value for item in ItemId]
 
         if key in item_ids:
-            self.add_item(Item(ItemId(key)))
+            self.inventory.add_item(ItemId(key), 1)
+        elif event.key == pygame.K_BACKSPACE:
+            self.set_filter(self.query[:-1])
+        elif event.key == pygame.K_ESCAPE:
+            self.set_filter("")
 
     def set_slots(self):
-        for y in range(self.display.get_height() // 2 - ((constants.INV_TILE_SIZE + self.padding) * self.rows) // 2,
-                       self.display.get_height() // 2 + ((constants.INV_TILE_SIZE + self.padding) * self.rows) // 2,
-                       constants.INV_TILE_SIZE + self.padding):
-            for x in range(
-                    self.display.get_width() // 2 - ((constants.INV_TILE_SIZE + self.padding) * self.columns) // 2,
-                    self.display.get_width() // 2 + ((constants.INV_TILE_SIZE + self.padding) * self.columns) // 2,
-                    constants.INV_TILE_SIZE + self.padding):
-                self.slots.append(InventorySlot((x, y)))
-
-    def draw_slots(self):
-        for slot in self.slots:
-            slot.draw(self.display)
-        for slot in self.slots:
-            slot.draw_item(self.display)
+        pitch = constants.INV_TILE_SIZE + self.padding
+        visible_rows = self.rows if self.visibleRows is None else min(self.visibleRows, self.rows)
+        origin = (self.display.get_width() // 2 - (pitch * self.columns) // 2,
+                  self.display.get_height() // 2 - (pitch * visible_rows) // 2)
+        self.add_grid(SlotGrid(origin, self.rows, self.columns, constants.INV_TILE_SIZE, self.padding,
+                               visible_rows))
 
-    def place_item(self):
-        mouse_position = pygame.math.Vector2(pygame.mouse.get_pos()[0], pygame.mouse.get_pos()[1]) / 2
-        for slot in self.slots:
-            if slot.rect.collidepoint(mouse_position):
-                if slot.item is None:
-                    self.remove_item(self.movingItem)
-                    self.add_item(self.movingItem, slot)
-                else:
-                    temp = slot.item
-                    self.remove_item(self.movingItem)
-                    slot.item = self.movingItem
-                    self.movingSlot.item = temp
+    def add_grid(self, grid: SlotGrid):
+        # Hotbars, chests and other containers are extra grids sharing the same drag and drop
+        grid.start = len(self.inventory.slots)
+        self.grids.append(grid)
+        self.inventory.extend(grid.size)
+        grid.layout(self.inventory)
+        self.mark_dirty(grid.rect)
 
+    def grid_of(self, index: int) -> SlotGrid | None:
+        for grid in self.grids:
+            if grid.start <= index < grid.start + grid.size:
+                return grid
+        return None
+
+    def sync_slot(self, index: int):
+        # Only slots on a visible row are redrawn, the rest is picked up when scrolled into view
+        grid = self.grid_of(index)
+        found = None if grid is None else grid.view_of(index)
+        if found is None:
+            return
+        view, slot = found
+        grid.sync(slot, self.inventory)
+        view.render_slot(slot)
+        self.mark_dirty(grid.slot_rect(slot, view.row))
+
+    def set_filter(self, query: str):
+        # Slots holding items that do not match are greyed out
+        self.query = query
+        results = self.search.search(query) if query.strip() else None
+        for grid in self.grids:
+            grid.results = results
+            grid.refresh(self.inventory)
+            self.mark_dirty(grid.rect)
+
+    def index_at(self, position: tuple) -> int | None:
+        for grid in self.grids:
+            if grid.rect.collidepoint(position):
+                return grid.index_at(position)
+        return None
+
+    def scroll(self, position: tuple, rows: float):
+        for grid in self.grids:
+            if grid.rect.collidepoint(position):
+                grid.scroll_by(rows * grid.pitch)
+
+    def place_item(self, position: tuple):
+        if self.movingItem is None:
+            return
         self.movingItem.dragging = False
+        index = self.index_at(position)
+        if index is not None:
+            # Empty targets take the stack, same items merge and different ones swap
+            self.inventory.move(self.movingIndex, index)
+
         self.movingItem = None
+        self.move_ghost(None)
+        # The dragged stack may have stayed where it was
+        self.sync_slot(self.movingIndex)
 
-    def add_item(self, item: Item, slot: InventorySlot = None):
-        if slot is None:
-            for slot in self.slots:
-                if slot.item is None:
-                    slot.item = item
-                    break
-        else:
-            if slot.item is None:
-                slot.item = self.movingItem
+    def add_item(self, item: Item, index: int = None):
+        index = self.inventory.first_free() if index is None else index
+        if index is not None:
+            self.inventory.place(index, item)
 
-    def drag_item(self):
-        mouse_position = pygame.math.Vector2((pygame.mouse.get_pos()[0], pygame.mouse.get_pos()[1])) / 2
-        for slot in self.slots:
-            if slot.rect.collidepoint(mouse_position) and slot.item is not None:
-                slot.item.dragging = True
-                self.movingItem = slot.item
-                self.movingSlot = slot
-                break
+    def drag_item(self, position: tuple):
+        index = self.index_at(position)
+        if index is not None and self.inventory.slots[index] is not None:
+            self.movingItem = self.inventory.slots[index]
+            self.movingItem.dragging = True
+            self.movingIndex = index
+            self.sync_slot(index)
 
     def remove_item(self, item: Item):
-        for slot in self.slots:
-            if slot.item is item:
-                slot.item = None
-                break
+        index = self.inventory.slot_of(item)
+        if index is not None:
+            self.inventory.take(index)
 
-    def draw(self) -> None:
-        self.display.fill(constants.BG_COLOR1)
-        self.draw_slots()
+    def move_ghost(self, rect: pygame.Rect | None):
+        # The dragged icon is redrawn where it was and where it is now
+        if rect == self.ghostRect:
+            return
+        if self.ghostRect is not None:
+            self.mark_dirty(self.ghostRect)
+        if rect is not None:
+            self.mark_dirty(rect)
+        self.ghostRect = rect
 
+    def update(self, dt: float, manager: scene.SceneManager) -> None:
+        if self.save is not None:
+            self.autosaveTimer += dt
+            if self.autosaveTimer >= constants.AUTOSAVE_INTERVAL:
+                self.autosaveTimer = 0.0
+                self.save.autosave()
+        for grid in self.grids:
+            if grid.update(dt):
+                grid.layout(self.inventory)
+                self.mark_dirty(grid.rect)
+        if self.movingItem is not None:
+            mouse_position = pygame.math.Vector2(pygame.mouse.get_pos()[0], pygame.mouse.get_pos()[1]) / 2
+            rect = pygame.Rect(0, 0, constants.INV_TILE_SIZE, constants.INV_TILE_SIZE)
+            self.ghostPosition = mouse_position - (rect.width / 2, rect.height / 2)
+            rect.topleft = self.ghostPosition
+            # One pixel of margin covers the rounding of the blit position
+            self.move_ghost(rect.inflate(2, 2))
+
+    def draw(self) -> None:
+        redraw(self.display, self.dirty.regions(), self.draw_region)
 
+    def draw_region(self, rect: pygame.Rect) -> None:
+        self.display.fill(constants.BG_COLOR1, rect)
+        for grid in self.grids:
+            if grid.rect.colliderect(rect):
+                grid.draw(self.display)
+        if self.movingItem is not None and self.ghostRect is not None and self.ghostRect.colliderect(rect):
+            self.display.blit(item_registry.scaled_icon(self.movingItem.definition,
+                                                        (constants.INV_TILE_SIZE, constants.INV_TILE_SIZE)),
+                              self.ghostPosition)
@@ -0,0 +1,79 @@
+import json
+import pygame
+import icon_atlas
+from cache import LRUCache
+
+ITEMS_PATH = "../Data/items.json"
+SCALED_ICONS_CAPACITY = 256
+
+
+class ItemDefinition:
+    # Shared by every Item instance of the same id, so it only holds immutable data
+    __slots__ = ("key", "name", "description", "iconPath", "image", "registry")
+
+    def __init__(self, key: str, data: dict, registry: "ItemRegistry"):
+        self.key = key
+        self.registry = registry
+        self.name = data["name"]
+        self.description = data["description"]
+        self.iconPath = data["iconPath"]
+        self.image: pygame.Surface | None = None
+
+    @property
+    def icon(self) -> pygame.Surface:
+        # A view into the shared icon atlas, nothing is decoded per item
+        if self.image is None:
+            self.image = self.registry.atlas.icon(self.key)
+        return self.image
+
+
+class ItemRegistry:
+    def __init__(self, path: str = ITEMS_PATH, atlas_path: str = icon_atlas.ATLAS_PATH):
+        self.path = path
+        self.atlasPath = atlas_path
+        self.definitions: dict[str, ItemDefinition] | None = None
+        self.__atlas: icon_atlas.IconAtlas | None = None
+
+    @property
+    def atlas(self) -> icon_atlas.IconAtlas:
+        # Read from the prebaked cache, rebuilt when the catalog or an icon changed
+        if self.__atlas is None:
+            self.__atlas = icon_atlas.load(self.path, self.atlasPath)
+        return self.__atlas
+
+    def load(self) -> dict[str, ItemDefinition]:
+        if self.definitions is None:
+            with open(self.path) as data:
+                items_data = json.load(data)
+            self.definitions = {key: ItemDefinition(key, value, self) for key, value in items_data.items()}
+        return self.definitions
+
+    def get(self, key: str) -> ItemDefinition:
+        return self.load()[key]
+
+    @property
+    def loaded_icons(self) -> int:
+        return sum(1 for definition in self.load().values() if definition.image is not None)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.load()
+
+    def __iter__(self):
+        return iter(self.load().values())
+
+    def __len__(self) -> int:
+        return len(self.load())
+
+
+registry = ItemRegistry()
+
+# Scaled icon variants keyed by (item, size, smooth)
+scaled_icons = LRUCache(SCALED_ICONS_CAPACITY)
+
+
+def scaled_icon(definition: ItemDefinition, size: tuple[int, int], smooth: bool = False) -> pygame.Surface:
+    def scale() -> pygame.Surface:
+        if smooth:
+            return pygame.transform.smoothscale(definition.icon, size)
+        return pygame.transform.scale(definition.icon, size)
+    return scaled_icons.get_or_create((definition.key, size, smooth), scale)
@@ -0,0 +1,117 @@
+from array import array
+import item_registry
+
+# Every substring of a word up to this length has its own posting, longer query words are looked up through one
+GRAM_SIZE = 3
+# Words found in more than one item in this many keep a bitset, rarer ones only their positions
+DENSE_RATIO = 64
+
+
+class SearchResults:
+    # Matches as one bit per catalog item, so narrowing a search is a single and of two integers
+    def __init__(self, search: "ItemSearch", mask: int):
+        self.search = search
+        self.mask = mask
+
+    def __contains__(self, key: str) -> bool:
+        position = self.search.positions.get(key)
+        return position is not None and self.mask >> position & 1 == 1
+
+    def __iter__(self):
+        keys = self.search.keys
+        # Lowest bit first
+        bits = bin(self.mask)[:1:-1]
+        position = bits.find("1")
+        while position != -1:
+            yield keys[position]
+            position = bits.find("1", position + 1)
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+
+class ItemSearch:
+    def __init__(self, registry: item_registry.ItemRegistry = item_registry.registry):
+        self.registry = registry
+        self.keys: list[str] | None = None
+        self.positions: dict[str, int] = {}
+        self.sparseWords: dict[str, array] = {}
+        self.denseWords: dict[str, int] = {}
+        self.gramWords: dict[str, list[str]] = {}
+        self.grams: dict[str, int] = {}
+        # Results of the queries the current one extends, so typing a letter refines instead of starting over
+        self.history: list[tuple[str, SearchResults]] = []
+
+    def build(self):
+        # Meant to run when the catalog is loaded, searching before that builds it on the spot
+        if self.keys is not None:
+            return
+        self.keys = []
+        words: dict[str, array] = {}
+        for position, definition in enumerate(self.registry):
+            self.keys.append(definition.key)
+            self.positions[definition.key] = position
+            for word in set(f"{definition.name} {definition.description}".lower().split()):
+                postings = words.get(word)
+                if postings is None:
+                    postings = words[word] = array("i")
+                postings.append(position)
+        # Catalog text repeats a lot, so grams are taken over the distinct words only
+        dense = len(self.keys) // DENSE_RATIO
+        for word, postings in words.items():
+            if len(postings) > dense:
+                self.denseWords[word] = self.bitset([postings])
+            else:
+                self.sparseWords[word] = postings
+            for gram in {word[start:start + size] for size in range(1, GRAM_SIZE + 1)
+                         for start in range(len(word) - size + 1)}:
+                self.gramWords.setdefault(gram, []).append(word)
+        self.grams = {gram: self.join(gram_words) for gram, gram_words in self.gramWords.items()}
+
+    def bitset(self, postings: list[array]) -> int:
+        bits = bytearray(len(self.keys) // 8 + 1)
+        for positions in postings:
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, "little")
+
+    def join(self, words: list[str]) -> int:
+        # Positions of the sparse words are set in one pass, dense words are or-ed in whole
+        sparse = []
+        mask = 0
+        for word in words:
+            postings = self.sparseWords.get(word)
+            if postings is None:
+                mask |= self.denseWords[word]
+            else:
+                sparse.append(postings)
+        return mask | self.bitset(sparse)
+
+    def matches(self, word: str) -> int:
+        # Flags the items with a word containing this query word
+        if len(word) <= GRAM_SIZE:
+            return self.grams.get(word, 0)
+        return self.join([found for found in self.gramWords.get(word[-GRAM_SIZE:], ()) if word in found])
+
+    def search(self, query: str) -> SearchResults:
+        # Matches every query word, results hold item keys, the values of inventory.ItemId
+        self.build()
+        query = " ".join(query.lower().split())
+        while self.history and not query.startswith(self.history[-1][0]):
+            self.history.pop()
+        if self.history and self.history[-1][0] == query:
+            return self.history[-1][1]
+        mask = (1 << len(self.keys)) - 1
+        if not query:
+            return SearchResults(self, mask)
+        words = query.split()
+        if self.history:
+            # The words before the previous last one are already matched, the rest grew or is new
+            previous, results = self.history[-1]
+            mask = results.mask
+            words = words[len(previous.split()) - 1:]
+        for word in words:
+            mask &= self.matches(word)
+        results = SearchResults(self, mask)
+        self.history.append((query, results))
+        return results
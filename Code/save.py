@@ -0,0 +1,146 @@
+from __future__ import annotations
+import os
+import struct
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from inventory import Inventory, Item
+
+SAVE_PATH = "../Data/inventory.sav"
+SAVE_VERSION = 1
+# Journal records kept before they are folded into a new snapshot
+COMPACT_AFTER = 512
+
+# Magic, version, generation, slot count
+SNAPSHOT_HEADER = struct.Struct("<4sHII")
+# Longest item key a record can hold
+KEY_SIZE = 8
+# Item key and quantity, one per slot in order
+SLOT_RECORD = struct.Struct(f"<{KEY_SIZE}sH")
+# Magic, version, generation of the snapshot it applies to
+JOURNAL_HEADER = struct.Struct("<4sHI")
+# Slot index, item key and quantity written to it
+JOURNAL_RECORD = struct.Struct(f"<I{KEY_SIZE}sH")
+
+
+class InventorySave:
+    def __init__(self, inventory: Inventory, item_factory: Callable[[str], Item], path: str = SAVE_PATH,
+                 compact_after: int = COMPACT_AFTER):
+        self.inventory = inventory
+        # Builds the item for a saved key, raising ValueError for keys the catalog does not know
+        self.itemFactory = item_factory
+        # Keys found in the save that could not be restored, their slots are left empty
+        self.unknownKeys: set[str] = set()
+        self.path = path
+        self.journalPath = path + ".journal"
+        self.compactAfter = compact_after
+        self.generation = 0
+        self.journalRecords = 0
+        # Set once the files on disk match this inventory, until then autosave writes a full snapshot
+        self.synced = False
+        # Slots changed since the last autosave, written with whatever they hold by then
+        self.pending: set[int] = set()
+        self.inventory.listeners.append(self.mark)
+
+    def mark(self, index: int):
+        self.pending.add(index)
+
+    def slot_bytes(self, index: int) -> tuple[bytes, int]:
+        item = self.inventory.slots[index]
+        if item is None:
+            return b"", 0
+        key = item.id.value.encode()
+        if len(key) > KEY_SIZE:
+            raise ValueError(f"item key {item.id.value!r} is longer than {KEY_SIZE} bytes")
+        return key, self.inventory.quantities[index]
+
+    def load(self) -> bool:
+        # Bulk unpacks the snapshot, then replays the journal written on top of it
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"{self.path} is not an inventory save")
+        magic, version, self.generation, count = SNAPSHOT_HEADER.unpack_from(data, 0)
+        end = SNAPSHOT_HEADER.size + count * SLOT_RECORD.size
+        if magic != b"INVS" or version != SAVE_VERSION or len(data) != end:
+            raise ValueError(f"{self.path} is not an inventory save")
+        if count > len(self.inventory.slots):
+            self.inventory.extend(count - len(self.inventory.slots))
+        records = struct.iter_unpack(SLOT_RECORD.format, data[SNAPSHOT_HEADER.size:end])
+        for index, (key, quantity) in enumerate(records):
+            self.restore(index, key, quantity)
+        # Without a journal for this snapshot the next autosave has to write both again
+        self.synced = self.replay()
+        self.pending.clear()
+        return True
+
+    def replay(self) -> bool:
+        # Whether a journal written on top of the loaded snapshot was found
+        try:
+            with open(self.journalPath, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < JOURNAL_HEADER.size:
+            # Cut short while compact was writing it
+            return False
+        magic, version, generation = JOURNAL_HEADER.unpack_from(data, 0)
+        if magic != b"INVJ" or version != SAVE_VERSION or generation != self.generation:
+            # Left over from before the last compaction
+            return False
+        # A record cut short by a crash is dropped
+        body = data[JOURNAL_HEADER.size:]
+        body = body[:len(body) - len(body) % JOURNAL_RECORD.size]
+        for index, key, quantity in struct.iter_unpack(JOURNAL_RECORD.format, body):
+            self.restore(index, key, quantity)
+            self.journalRecords += 1
+        return True
+
+    def restore(self, index: int, key: bytes, quantity: int):
+        if index >= len(self.inventory.slots):
+            return
+        key = key.rstrip(b"\0").decode(errors="replace")
+        current = self.inventory.slots[index]
+        if current is not None and current.id.value == key:
+            self.inventory.set_quantity(index, quantity)
+            return
+        item = None
+        if key:
+            try:
+                item = self.itemFactory(key)
+            except ValueError:
+                self.unknownKeys.add(key)
+        if item is not None:
+            self.inventory.set_slot(index, item, quantity)
+        elif current is not None:
+            self.inventory.set_slot(index, None, 0)
+
+    def autosave(self):
+        # Appends only the slots that changed, rewriting everything once the journal grows too long
+        if not self.pending:
+            return
+        if not self.synced or self.journalRecords + len(self.pending) > self.compactAfter:
+            self.compact()
+            return
+        with open(self.journalPath, "ab") as file:
+            for index in sorted(self.pending):
+                file.write(JOURNAL_RECORD.pack(index, *self.slot_bytes(index)))
+        self.journalRecords += len(self.pending)
+        self.pending.clear()
+
+    def compact(self):
+        self.generation += 1
+        with open(self.path + ".tmp", "wb") as file:
+            file.write(SNAPSHOT_HEADER.pack(b"INVS", SAVE_VERSION, self.generation, len(self.inventory.slots)))
+            file.write(b"".join(SLOT_RECORD.pack(*self.slot_bytes(index))
+                                for index in range(len(self.inventory.slots))))
+        os.replace(self.path + ".tmp", self.path)
+        # The new snapshot makes the old journal stale even if this write is lost
+        with open(self.journalPath, "wb") as file:
+            file.write(JOURNAL_HEADER.pack(b"INVJ", SAVE_VERSION, self.generation))
+        self.journalRecords = 0
+        self.pending.clear()
+        self.synced = True
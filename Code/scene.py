@@ -3,6 +3,7 @@ import pygame
 import basic_player
 import basic_inventory
 import constants
+from dirty_rects import DirtyRegions, redraw, track_sprites
 
 
 class Scene:
@@ -10,6 +11,14 @@ class Scene:
         self.name = name
         self.display = display
         self.sprites = pygame.sprite.Group()
+        self.dirty = DirtyRegions(display.get_rect())
+        self.spriteRects: dict[pygame.sprite.Sprite, pygame.Rect] = {}
+
+    def mark_dirty(self, rect: pygame.Rect):
+        self.dirty.add(rect)
+
+    def track_sprites(self):
+        self.spriteRects = track_sprites(self.sprites, self.spriteRects, self.dirty)
 
     def event_loop(self, manager: SceneManager, event: pygame.event.Event) -> None: ...
 
@@ -26,11 +35,15 @@ class BasicScene(Scene):
         self.player = basic_player.Player(self.sprites)
 
     def draw(self) -> None:
-        self.display.fill(constants.BG_COLOR1)
+        redraw(self.display, self.dirty.regions(), self.draw_region)
+
+    def draw_region(self, rect: pygame.Rect) -> None:
+        self.display.fill(constants.BG_COLOR1, rect)
         self.sprites.draw(self.display)
 
     def update(self, dt: float, manager: SceneManager) -> None:
         self.sprites.update(dt)
+        self.track_sprites()
 
 
 class SceneManager:
@@ -39,12 +52,16 @@ class SceneManager:
 
     def enter_scene(self, new_scene: Scene):
         self.sceneStack.append(new_scene)
+        new_scene.dirty.invalidate()
 
     def exit_scene(self):
         self.sceneStack.pop()
+        if self.sceneStack:
+            self.sceneStack[-1].dirty.invalidate()
 
     def set_scene(self, new_scene: Scene):
         self.sceneStack = [new_scene]
+        new_scene.dirty.invalidate()
 
     def input(self):
         if self.sceneStack:
@@ -58,6 +75,12 @@ class SceneManager:
         if self.sceneStack:
             self.sceneStack[-1].update(dt, self)
 
-    def draw(self):
-        if self.sceneStack:
-            self.sceneStack[-1].draw()
+    def draw(self) -> list[pygame.Rect]:
+        # Returns the canvas regions that were redrawn
+        if not self.sceneStack:
+            return []
+        scene = self.sceneStack[-1]
+        if not constants.DIRTY_RECTS:
+            scene.dirty.invalidate()
+        scene.draw()
+        return scene.dirty.flush()
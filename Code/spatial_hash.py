@@ -0,0 +1,55 @@
+import pygame
+
+
+class SpatialHash:
+    def __init__(self, cell_size: int = 64):
+        self.cellSize = cell_size
+        self.cells: dict[tuple[int, int], set] = {}
+        self.rects: dict[object, pygame.Rect] = {}
+        self.itemCells: dict[object, list[tuple[int, int]]] = {}
+
+    def cells_for(self, rect: pygame.Rect) -> list[tuple[int, int]]:
+        left, top = rect.left // self.cellSize, rect.top // self.cellSize
+        right, bottom = (rect.right - 1) // self.cellSize, (rect.bottom - 1) // self.cellSize
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def insert(self, item, rect: pygame.Rect):
+        self.rects[item] = pygame.Rect(rect)
+        cells = self.cells_for(rect)
+        self.itemCells[item] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(item)
+
+    def remove(self, item):
+        for cell in self.itemCells.pop(item, ()):
+            bucket = self.cells[cell]
+            bucket.discard(item)
+            if not bucket:
+                del self.cells[cell]
+        self.rects.pop(item, None)
+
+    def move(self, item, rect: pygame.Rect):
+        # Only touches the buckets when the item actually crosses a cell border
+        cells = self.cells_for(rect)
+        if cells != self.itemCells.get(item):
+            self.remove(item)
+            self.insert(item, rect)
+        else:
+            self.rects[item] = pygame.Rect(rect)
+
+    def query(self, rect: pygame.Rect) -> list:
+        found = []
+        seen = set()
+        for cell in self.cells_for(rect):
+            for item in self.cells.get(cell, ()):
+                if item not in seen:
+                    seen.add(item)
+                    if self.rects[item].colliderect(rect):
+                        found.append(item)
+        return found
+
+    def __contains__(self, item) -> bool:
+        return item in self.rects
+
+    def __len__(self) -> int:
+        return len(self.rects)
@@ -0,0 +1,437 @@
+import asyncio
+import math
+import queue
+import re
+import threading
+from array import array
+from typing import AsyncIterable, Iterable
+import pygame
+import constants
+import fonts
+from cache import LRUCache
+
+
+class GlyphAtlas:
+    def __init__(self, font: pygame.font.Font, size: tuple[int, int] = (256, 256)):
+        self.font = font
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.glyphs: dict[tuple, pygame.Rect] = {}
+        # Shelf packing cursor
+        self.shelfX = 0
+        self.shelfY = 0
+        self.shelfHeight = 0
+
+    def glyph(self, char: str, color, antialias: bool = False) -> pygame.Rect:
+        key = (char, color, antialias)
+        rect = self.glyphs.get(key)
+        if rect is None:
+            rect = self.pack(self.font.render(char, antialias, color).convert_alpha())
+            self.glyphs[key] = rect
+        return rect
+
+    def pack(self, image: pygame.Surface) -> pygame.Rect:
+        width, height = image.get_size()
+        if self.shelfX + width > self.surface.get_width():
+            self.shelfX = 0
+            self.shelfY += self.shelfHeight
+            self.shelfHeight = 0
+        if self.shelfY + height > self.surface.get_height():
+            self.grow(self.shelfY + height)
+        rect = pygame.Rect(self.shelfX, self.shelfY, width, height)
+        # MAX blending copies the glyph's alpha untouched onto the empty atlas area
+        self.surface.blit(image, rect, special_flags=pygame.BLEND_RGBA_MAX)
+        self.shelfX += width
+        self.shelfHeight = max(self.shelfHeight, height)
+        return rect
+
+    def grow(self, min_height: int):
+        # Only the height grows so every packed rect stays valid
+        height = self.surface.get_height()
+        while height < min_height:
+            height *= 2
+        surface = pygame.Surface((self.surface.get_width(), height), pygame.SRCALPHA)
+        surface.blit(self.surface, (0, 0), special_flags=pygame.BLEND_RGBA_MAX)
+        self.surface = surface
+
+    def blit(self, target: pygame.Surface, char: str, color, position: tuple, antialias: bool = False) -> pygame.Rect:
+        area = self.glyph(char, color, antialias)
+        return target.blit(self.surface, position, area)
+
+
+atlases: dict[tuple[str, int], GlyphAtlas] = {}
+# Recently rendered strings, shared by every label
+rendered_text = LRUCache(128)
+
+
+def get_atlas(size: int, path: str = fonts.FONT_PATH) -> GlyphAtlas:
+    atlas = atlases.get((path, size))
+    if atlas is None:
+        atlas = GlyphAtlas(fonts.get_font(size, path))
+        atlases[(path, size)] = atlas
+    return atlas
+
+
+def render_text(font: pygame.font.Font, text: str, color, antialias: bool = False) -> pygame.Surface:
+    return rendered_text.get_or_create((font, text, color, antialias),
+                                       lambda: font.render(text, antialias, color))
+
+
+class PageLayout:
+    def __init__(self, lines: list[list[str]], atlas: GlyphAtlas, color, antialias: bool = False,
+                 runs: "MarkupRuns" = None, offset: int = 0):
+        self.atlas = atlas
+        self.color = color
+        self.antialias = antialias
+        # Markup runs are indexed by the page's first character in the whole text
+        self.runs = runs
+        self.offset = offset
+        self.lineHeight = atlas.font.get_height()
+        self.glyphs: list[tuple[pygame.Surface, tuple[int, int], pygame.Rect]] = []
+        # revealed[i] is the number of glyphs drawn once i characters are shown
+        self.revealed: list[int] = [0]
+        # units[i] is the counter value that shows character i, None when every character costs one
+        self.units: list[float] | None = None
+        self.lineCount = 0
+        self.length = 0
+        self.x, self.y = 0, 0
+        self.extend(lines)
+
+    def extend(self, lines: list[list[str]]):
+        placed: list[tuple[tuple[int, int], pygame.Rect]] = []
+        runs = self.runs
+        if self.units is None and runs is not None and not runs.uniform:
+            # Timed markup may arrive with a later chunk, the characters laid out so far get their units then
+            self.start = runs.times[self.offset - 1] if self.offset > 0 else 0.0
+            self.units = [runs.times[self.offset + index] - self.start for index in range(self.length)]
+        for line in lines:
+            if self.lineCount > 0:
+                # The line break counts as one character, like the space it replaced
+                self.x = 0
+                self.y += self.lineHeight
+                self.add_units()
+                self.revealed.append(len(self.glyphs) + len(placed))
+            for char in " ".join(line):
+                color = self.color if runs is None else runs.palette[runs.colors[self.offset + self.length]]
+                area = self.atlas.glyph(char, color, self.antialias)
+                if not char.isspace():
+                    placed.append(((self.x, self.y), area))
+                self.x += area.width
+                self.add_units()
+                self.revealed.append(len(self.glyphs) + len(placed))
+            self.lineCount += 1
+        # Packing may have grown the atlas, so the current surface is referenced
+        self.glyphs.extend((self.atlas.surface, position, area) for position, area in placed)
+
+    def add_units(self):
+        if self.units is not None:
+            self.units.append(self.runs.times[self.offset + self.length] - self.start)
+        self.length += 1
+
+    @property
+    def duration(self) -> float:
+        if self.units is None:
+            return self.length
+        return self.units[-1] if self.units else 0.0
+
+    def revealed_at(self, counter: float, start: int) -> int:
+        if self.units is None:
+            return min(int(counter), self.length)
+        index = start
+        while index < self.length and self.units[index] <= counter:
+            index += 1
+        return index
+
+    def threshold(self, index: int) -> float:
+        # Counter value at which the character after index is shown
+        if index >= self.length:
+            return math.inf
+        return index + 1 if self.units is None else self.units[index]
+
+    def blit(self, target: pygame.Surface, start: int, end: int) -> pygame.Rect | None:
+        # Returns the area covered by the newly drawn glyphs
+        rects = target.blits(self.glyphs[self.revealed[start]:self.revealed[end]])
+        if not rects:
+            return None
+        return rects[0].unionall(rects[1:])
+
+
+# Word widths are shared by every wrapper using the same font
+word_widths: dict[pygame.font.Font, dict[str, int]] = {}
+
+
+class TextWrapper:
+    def __init__(self, font: pygame.font.Font, max_width: int):
+        self.font = font
+        self.maxWidth = max_width
+        self.widths = word_widths.setdefault(font, {})
+        self.spaceWidth = self.word_width(" ")
+        self.lines: list[list[str]] = []
+        self.line: list[str] = []
+        self.x = 0
+        # Trailing word of the last append, it may continue in the next chunk
+        self.pending = ""
+
+    def word_width(self, word: str) -> int:
+        width = self.widths.get(word)
+        if width is None:
+            width = self.font.size(word)[0]
+            self.widths[word] = width
+        return width
+
+    def clear(self):
+        self.lines = []
+        self.line = []
+        self.x = 0
+        self.pending = ""
+
+    def wrap(self, text: str) -> list[list[str]]:
+        self.clear()
+        self.append(text)
+        self.finish()
+        return self.lines
+
+    def append(self, text: str):
+        paragraphs = (self.pending + text).split("\n")
+        for paragraph in paragraphs[:-1]:
+            self.add_words(paragraph.split(" "))
+            self.break_line()
+        words = paragraphs[-1].split(" ")
+        self.pending = words.pop()
+        self.add_words(words)
+
+    def finish(self):
+        if self.pending or self.line:
+            self.add_words([self.pending])
+            self.break_line()
+        self.pending = ""
+
+    def add_words(self, words: list[str]):
+        for word in words:
+            word_width = self.word_width(word)
+            if self.line and self.x + word_width >= self.maxWidth:
+                self.break_line()
+            self.x += word_width + self.spaceWidth
+            self.line.append(word)
+
+    def break_line(self):
+        self.lines.append(self.line)
+        self.line = []
+        self.x = 0
+
+    def new_lines(self) -> list[list[str]]:
+        # Lines completed since the previous call, handed over so a streamed script is only held once
+        lines = self.lines
+        self.lines = []
+        return lines
+
+    def iter_lines(self, start: int = 0):
+        index = start
+        while index < len(self.lines):
+            yield self.lines[index]
+            index += 1
+
+
+class Paginator:
+    def __init__(self, font: pygame.font.Font, size: tuple[int, int], background):
+        self.font = font
+        self.maxHeight = size[1]
+        self.background = background
+        self.lines: list[list[str]] = []
+        # Position of each line's first character in the whole text
+        self.offsets: list[int] = []
+        self.characters = 0
+        # [start, end) line ranges, the last page stays open while lines are added
+        self.pages: list[list[int]] = []
+        self.pageHeight = 0
+        self.current = -1
+        # Two page surfaces are reused for every page turn
+        self.surfaces = [pygame.Surface(size), pygame.Surface(size)]
+        self.back = 0
+
+    def paginate(self, lines: list[list[str]]):
+        self.lines = []
+        self.offsets = []
+        self.characters = 0
+        self.pages = []
+        self.pageHeight = 0
+        self.current = -1
+        self.extend(lines)
+
+    def extend(self, lines: list[list[str]]):
+        for line in lines:
+            text = " ".join(line)
+            height = self.font.size(text)[1]
+            if not self.pages or (self.pageHeight + height > self.maxHeight and
+                                  self.pages[-1][1] > self.pages[-1][0]):
+                self.pages.append([len(self.lines), len(self.lines)])
+                self.pageHeight = 0
+            self.lines.append(line)
+            self.offsets.append(self.characters)
+            # The line break takes the place of one character
+            self.characters += len(text) + 1
+            self.pages[-1][1] += 1
+            self.pageHeight += height
+
+    def page(self, index: int) -> list[list[str]]:
+        if not self.pages:
+            return []
+        start, end = self.pages[index]
+        return self.lines[start:end]
+
+    def offset(self, index: int) -> int:
+        if not self.pages:
+            return 0
+        return self.offsets[self.pages[index][0]]
+
+    def goto(self, index: int) -> list[list[str]]:
+        self.current = index
+        return self.page(index)
+
+    def has_next(self) -> bool:
+        return self.current + 1 < len(self.pages)
+
+    def has_previous(self) -> bool:
+        return self.current > 0
+
+    def next_surface(self) -> pygame.Surface:
+        self.back = 1 - self.back
+        surface = self.surfaces[self.back]
+        surface.fill(self.background)
+        return surface
+
+
+class TextStream:
+    def __init__(self, source: str | Iterable[str] | AsyncIterable[str], threaded: bool = False):
+        self.exhausted = False
+        if isinstance(source, str):
+            source = (source,)
+        self.iterator = None
+        self.chunks: queue.Queue | None = None
+        # Async sources and blocking iterators (like a process output) are read on a worker thread
+        if threaded or hasattr(source, "__aiter__"):
+            self.chunks = queue.Queue()
+            threading.Thread(target=self.pump, args=(source,), daemon=True).start()
+        else:
+            self.iterator = iter(source)
+
+    def pump(self, source):
+        try:
+            if hasattr(source, "__aiter__"):
+                asyncio.run(self.pump_async(source))
+            else:
+                for chunk in source:
+                    self.chunks.put(chunk)
+        finally:
+            self.chunks.put(None)
+
+    async def pump_async(self, source: AsyncIterable[str]):
+        async for chunk in source:
+            self.chunks.put(chunk)
+
+    def read(self) -> str | None:
+        # Next chunk, or None when the source has ended or nothing is ready yet
+        if self.exhausted:
+            return None
+        if self.chunks is None:
+            chunk = next(self.iterator, None)
+        else:
+            try:
+                chunk = self.chunks.get_nowait()
+            except queue.Empty:
+                return None
+        if chunk is None:
+            self.exhausted = True
+        return chunk
+
+
+MARKUP_TAG = re.compile(r"\[(?:/(color|speed)|(color|speed|pause)=([^\]]+))\]")
+# Longest text held back at the end of a chunk because it could be the start of a tag
+MARKUP_TAG_LIMIT = 32
+
+
+class MarkupRuns:
+    def __init__(self, color, speed: float):
+        self.speed = speed
+        self.palette = [color]
+        self.paletteIndex = {color: 0}
+        # One entry per character of the plain text
+        self.colors = array("H")
+        # Counter value at which each character is shown, in characters at the base speed
+        self.times = array("d")
+        self.colorStack = [0]
+        self.costStack = [1.0]
+        self.pause = 0.0
+        self.pending = ""
+        self.uniform = True
+
+    def feed(self, chunk: str) -> str:
+        # Consumes markup and returns the plain text it describes
+        text = self.pending + chunk
+        self.pending = ""
+        cut = text.rfind("[")
+        if cut != -1 and "]" not in text[cut:] and len(text) - cut < MARKUP_TAG_LIMIT:
+            self.pending = text[cut:]
+            text = text[:cut]
+        plain = []
+        position = 0
+        for match in MARKUP_TAG.finditer(text):
+            self.add(text[position:match.start()], plain)
+            # Tags with a value that does not parse are kept as text, like unknown tags
+            if not self.apply(*match.groups()):
+                self.add(match.group(), plain)
+            position = match.end()
+        self.add(text[position:], plain)
+        return "".join(plain)
+
+    def finish(self) -> str:
+        plain = []
+        self.add(self.pending, plain)
+        self.pending = ""
+        return "".join(plain)
+
+    def add(self, text: str, plain: list[str]):
+        if not text:
+            return
+        cost = self.costStack[-1]
+        first = (self.times[-1] if self.times else 0.0) + cost + self.pause
+        self.pause = 0.0
+        self.colors.extend([self.colorStack[-1]] * len(text))
+        self.times.extend([first + cost * index for index in range(len(text))])
+        plain.append(text)
+
+    def apply(self, closing: str | None, name: str | None, value: str | None) -> bool:
+        if closing == "color":
+            if len(self.colorStack) > 1:
+                self.colorStack.pop()
+        elif closing == "speed":
+            if len(self.costStack) > 1:
+                self.costStack.pop()
+        elif name == "color":
+            try:
+                self.colorStack.append(self.color_index(value))
+            except ValueError:
+                return False
+        else:
+            try:
+                number = float(value)
+            except ValueError:
+                return False
+            if not math.isfinite(number) or number < 0 or name == "speed" and number == 0:
+                return False
+            if name == "pause":
+                self.pause += number * self.speed
+            else:
+                self.costStack.append(self.speed / number)
+            self.uniform = False
+        return True
+
+    def color_index(self, value: str) -> int:
+        # Names of the constants module colors are accepted as well as any pygame color
+        color = getattr(constants, value.upper(), value)
+        pygame.Color(color)
+        index = self.paletteIndex.get(color)
+        if index is None:
+            index = len(self.palette)
+            self.palette.append(color)
+            self.paletteIndex[color] = index
+        return index